@@ -1,25 +1,205 @@
-from j60adm.models import Person, EmailAddress
+import collections
 
+from django.db import connection, transaction
+from django.db.models import Count, Sum, Max, Case, When, IntegerField
+from django.utils import timezone
 
-def synchronize_addresses(qs=None):
+from j60adm.models import (
+    Person, EmailAddress, Registration, SurveyResponse,
+    AddressSynchronization,
+)
+from j60adm.linking import chunks
+
+
+EMAIL_STATES = ('new', 'bounce', 'none', 'sent')
+
+
+def insert_ignore_sql(connection):
+    """
+    Prefix and suffix of an INSERT statement that skips rows
+    violating a unique constraint.
+    """
+    if connection.vendor == 'sqlite':
+        return 'INSERT OR IGNORE', ''
+    elif connection.vendor == 'mysql':
+        return 'INSERT IGNORE', ''
+    else:
+        return 'INSERT', 'ON CONFLICT DO NOTHING'
+
+
+def synchronization_sources(since=None):
+    """
+    (queryset, source) of the linked registrations and survey responses
+    updated since the given time, or of all of them. Registrations go
+    first, so they win as source when both have the same address.
+    """
+    sources = []
+    for model, source in [(Registration, 'Registration'),
+                          (SurveyResponse, 'Survey')]:
+        qs = model.objects.filter(person__isnull=False).order_by()
+        if since is not None:
+            qs = qs.filter(updated_time__gte=since)
+        sources.append((qs, source))
+    return sources
+
+
+def synchronize_addresses(full=False):
+    """
+    Add the email addresses of registrations and survey responses to the
+    persons they are linked to, skipping addresses the person already has.
+
+    Unless full is true, only rows whose updated_time is at least the
+    updated_time_mark of the previous synchronization are considered,
+    that is, rows created or re-linked since the latest row it saw.
+    A row saved in a transaction that commits after a synchronization
+    read the rows, with an updated_time below the new mark, is only
+    picked up by a full synchronization.
+
+    Addresses are compared as normalized by EmailAddress.normalize(),
+    which folds case beyond ASCII, unlike the databases' LOWER(), so
+    the comparison is done in Python rather than with INSERT ... SELECT.
+    To bound the memory used, the persons are handled a chunk at a time,
+    and the new addresses of each chunk are inserted with one
+    executemany(), relying on the unique constraint on (person, address)
+    to skip rows added concurrently. Return the number of addresses
+    created.
+    """
+    start = timezone.now()
+    previous = AddressSynchronization.objects.order_by('-time').first()
+    since = None
+    if not full and previous is not None:
+        since = previous.updated_time_mark
+
+    sources = synchronization_sources(since)
+    insert, on_conflict = insert_ignore_sql(connection)
+    sql = ("%s INTO %s (person_id, address, source) "
+           "VALUES (%%s, %%s, %%s) %s" % (
+               insert, EmailAddress._meta.db_table, on_conflict))
+    with transaction.atomic():
+        mark = since
+        person_ids = set()
+        for qs, source in sources:
+            latest = qs.aggregate(latest=Max('updated_time'))['latest']
+            if latest is not None:
+                mark = max(mark or latest, latest)
+            qs = qs.values_list('person_id', flat=True).distinct()
+            person_ids.update(qs)
+
+        created = 0
+        for chunk in chunks(sorted(person_ids)):
+            found = collections.OrderedDict()
+            for qs, source in sources:
+                qs = qs.filter(person_id__in=chunk)
+                for person_id, email in qs.values_list('person_id', 'email'):
+                    address = EmailAddress.normalize(email)
+                    if address:
+                        found.setdefault((person_id, address), source)
+            qs = EmailAddress.objects.filter(person_id__in=chunk)
+            existing = set((p, EmailAddress.normalize(a)) for p, a in
+                           qs.values_list('person_id', 'address'))
+            new = [(p, a, source) for (p, a), source in found.items()
+                   if (p, a) not in existing]
+            if new:
+                with connection.cursor() as cursor:
+                    cursor.executemany(sql, new)
+                    created += max(cursor.rowcount, 0)
+                Person.bump_row_versions(p for p, a, source in new)
+        AddressSynchronization.objects.create(
+            time=start, full=since is None, created=created,
+            updated_time_mark=mark)
+    return created
+
+
+def email_state(address_count, sent_count, new_count):
+    """
+    A person is 'sent' if any message to any address did not bounce,
+    'new' if some address has not been sent anything yet,
+    'bounce' if every message bounced, and 'none' without addresses.
+
+    >>> email_state(0, 0, 0)
+    'none'
+    >>> email_state(2, 1, 1)
+    'sent'
+    >>> email_state(2, 0, 1)
+    'new'
+    >>> email_state(2, 0, 0)
+    'bounce'
+    """
+    if not address_count:
+        return 'none'
+    elif sent_count:
+        return 'sent'
+    elif new_count:
+        return 'new'
+    else:
+        return 'bounce'
+
+
+def person_email_state(person):
+    """
+    The email_state() of a person with
+    emailaddress_set__emailmessage_set prefetched.
+    """
+    message_sets = [a.emailmessage_set.all()
+                    for a in person.emailaddress_set.all()]
+    return email_state(
+        len(message_sets),
+        sum(1 for ms in message_sets for m in ms if not m.bounce),
+        sum(1 for ms in message_sets if not ms))
+
+
+def annotate_email_state(qs):
+    """
+    Annotate each person with the arguments of email_state().
+    """
+    return qs.annotate(
+        email_address_count=Count('emailaddress', distinct=True),
+        email_sent_count=Sum(Case(
+            When(emailaddress__emailmessage__bounce=False, then=1),
+            default=0, output_field=IntegerField())),
+        email_new_count=Sum(Case(
+            When(emailaddress__isnull=False,
+                 emailaddress__emailmessage__isnull=True, then=1),
+            default=0, output_field=IntegerField())),
+    )
+
+
+def email_state_rows():
+    """
+    The arguments of email_state() for each person.
+    """
+    qs = annotate_email_state(Person.objects.order_by())
+    return qs.values_list('email_address_count', 'email_sent_count',
+                          'email_new_count')
+
+
+def email_state_counts():
+    """
+    Number of persons in each email state, computed in a single query.
+    """
+    counts = collections.Counter(
+        email_state(*row) for row in email_state_rows())
+    return collections.OrderedDict((s, counts[s]) for s in EMAIL_STATES)
+
+
+def bounce_domain(person):
+    return next(
+        a.address[a.address.index('@'):]
+        for a in person.emailaddress_set.all()
+        if any(m.bounce for m in a.emailmessage_set.all()))
+
+
+def persons_by_email_state(qs=None):
+    """
+    Group persons by email_state() in a single pass over a prefetched
+    queryset. Bounced persons are sorted by the domain that bounced.
+    """
     if qs is None:
         qs = Person.objects.all()
         qs = qs.prefetch_related(
-            'registration_set', 'surveyresponse_set', 'emailaddress_set')
-
-    create = []
+            'title_set', 'emailaddress_set__emailmessage_set')
+    by_state = collections.OrderedDict((s, []) for s in EMAIL_STATES)
     for person in qs:
-        addys = set(e.address for e in person.emailaddress_set.all())
-        for r in person.registration_set.all():
-            a = r.email.lower().strip()
-            if a not in addys:
-                create.append(EmailAddress(
-                    person=person, address=a, source='Registration'))
-                addys.add(a)
-        for r in person.surveyresponse_set.all():
-            a = r.email.lower().strip()
-            if a not in addys:
-                create.append(EmailAddress(
-                    person=person, address=a, source='Survey'))
-                addys.add(a)
-    EmailAddress.objects.bulk_create(create)
+        by_state[person_email_state(person)].append(person)
+    by_state['bounce'].sort(key=bounce_domain)
+    return by_state
@@ -1,12 +1,14 @@
 from django.contrib import admin
 from j60adm.models import (
-    Person, Title, EmailAddress, EmailMessage, Registration, SurveyResponse)
+    Person, Title, EmailAddress, EmailMessage, Registration, SurveyResponse,
+    AssociationConfig)
 
 
 class PersonAdmin(admin.ModelAdmin):
     list_display = ['name', 'street', 'city', 'country', 'dead',
                     'created_time']
     search_fields = ['name', 'street', 'city', 'country']
+    ordering = ['title_order', 'name']
 
 
 class TitleFilter(admin.SimpleListFilter):
@@ -65,9 +67,19 @@ class RegistrationAdmin(admin.ModelAdmin):
     search_fields = ['first_name', 'last_name', 'person__name']
 
 
+class AssociationConfigAdmin(admin.ModelAdmin):
+    list_display = ['name', 'current_period']
+
+    def has_add_permission(self, request):
+        # There is at most one AssociationConfig
+        return (super().has_add_permission(request) and
+                not AssociationConfig.objects.exists())
+
+
 admin.site.register(Person, PersonAdmin)
 admin.site.register(Title, TitleAdmin)
 admin.site.register(EmailAddress, EmailAddressAdmin)
 admin.site.register(EmailMessage, EmailMessageAdmin)
 admin.site.register(Registration, RegistrationAdmin)
 admin.site.register(SurveyResponse, SurveyResponseAdmin)
+admin.site.register(AssociationConfig, AssociationConfigAdmin)
@@ -0,0 +1,412 @@
+import io
+import re
+import time
+import uuid
+import random
+import tracemalloc
+import collections
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.template.loader import get_template
+
+from j60adm.models import (
+    Association, Person, Title, EmailAddress, Registration,
+)
+from j60adm.profiling import recording_queries
+from j60adm.synthetic import random_title_tokens
+
+
+BENCHMARKS = collections.OrderedDict()
+
+# URL names left out of the views benchmark: the template of
+# RegistrationShowUpdate, j60adm/registration_form.html, is missing.
+EXCLUDED_URLS = ('registration_show_update',)
+
+
+def benchmark(fn):
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+def best_time(fn, *args, repeat=3):
+    """
+    Minimum wall time in seconds of repeat calls to fn(*args).
+    """
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def measure(fn, n=1, repeat=3):
+    """
+    Best wall time of repeat calls to fn(), and the number of SQL queries
+    and the peak memory allocated by Python during one more call.
+    """
+    seconds = best_time(fn, repeat=repeat)
+    tracemalloc.start()
+    try:
+        with recording_queries() as queries:
+            fn()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return dict(seconds=seconds, per_second=n / seconds,
+                queries=len(queries), peak_memory=peak_memory)
+
+
+def legacy_title_parse(s):
+    # Title.parse as it was before j60adm.titles, for comparison
+    age = 0
+    prefixes = dict(zip('KGBOT', [-1, 1, 2, 3, 1]))
+    p = '^(%s|%s)(%s)$' % (Title.canonical_prefix_pattern,
+                           Title.prefix_pattern, Title.title_pattern)
+    mo = re.match(p, s)
+    if mo is None:
+        raise ValidationError("Couldn't parse %r" % (s,))
+    prefix_part = mo.group(1)
+    title = mo.group(2)
+    for mo in re.finditer(Title.prefix_term_pattern, prefix_part):
+        p = mo.group(0)
+        if len(p) == 1:
+            age += prefixes[p]
+        else:
+            age += prefixes[p[0]] * int(p[1:])
+
+    period = Association.get().current_period - age
+    return Title(period=period, title=title)
+
+
+@benchmark
+def titles(n=100000):
+    """
+    Parse n random title tokens with the old and the new title parser.
+    """
+    from j60adm.titles import parse_title, parse_title_at, parse_title_lines
+
+    tokens = random_title_tokens(n)
+    block = '\n'.join(''.join(tokens[i:i + 4])
+                      for i in range(0, len(tokens), 4))
+    uncached = parse_title_at.__wrapped__
+    current_period = Association.get().current_period
+
+    def run(parse):
+        return lambda: [parse(t) for t in tokens]
+
+    def run_uncached():
+        return [uncached(t, current_period) for t in tokens]
+
+    def run_lines():
+        parse_title_at.cache_clear()
+        return parse_title_lines(block)
+
+    results = collections.OrderedDict()
+    for name, fn in [('legacy Title.parse', run(legacy_title_parse)),
+                     ('Title.parse', run(Title.parse)),
+                     ('parse_title (uncached)', run_uncached),
+                     ('parse_title', run(parse_title)),
+                     ('parse_title_lines (cold cache)', run_lines)]:
+        elapsed = best_time(fn)
+        results[name] = dict(seconds=elapsed, per_second=n / elapsed)
+    return results
+
+
+@benchmark
+def person_list(n=2000):
+    """
+    Fetch and render n persons with three titles each in the person list,
+    with the title prefixes and dump() computed from title_set as before,
+    and with the materialized Person.dump_json. Runs in a transaction
+    that is rolled back.
+    """
+    template = get_template('j60adm/person_list_row.html')
+    rng = random.Random(0)
+    titles = 'CERM FORM INKA KASS NF PR SEKR VC FUAN FUHE FUIT'.split()
+    current_period = Association.get().current_period
+
+    def fetch(*lookups):
+        qs = Person.objects.filter(name__startswith='Benchmark ')
+        qs = qs.prefetch_related(
+            'registration_set', 'surveyresponse_set',
+            'emailaddress_set__emailmessage_set', *lookups)
+        return list(qs.order_by('title_order', 'name'))
+
+    def render(persons):
+        return ''.join(template.render(dict(person=p, csrf_token='x'))
+                       for p in persons)
+
+    def run_title_set():
+        persons = fetch('title_set')
+        for p in persons:
+            p.dump_json = p.display_name = ''
+        render(persons)
+        return [p.dump() for p in persons]
+
+    def run_cached():
+        persons = fetch()
+        render(persons)
+        return [p.dump() for p in persons]
+
+    results = collections.OrderedDict()
+    with transaction.atomic():
+        from j60adm.importer import bulk_create_with_ids
+
+        persons = bulk_create_with_ids(Person, [
+            Person(name='Benchmark %s' % i, dead=False, letter_bounced=False)
+            for i in range(n)])
+        bulk_create_with_ids(Title, [
+            Title(person=p, title=rng.choice(titles),
+                  period=current_period - rng.randrange(50))
+            for p in persons for _ in range(3)])
+        Person.update_cached_fields([p.pk for p in persons])
+        for name, fn in [('title_set', run_title_set),
+                         ('dump_json', run_cached)]:
+            elapsed = best_time(fn)
+            results[name] = dict(seconds=elapsed, per_second=n / elapsed)
+        transaction.set_rollback(True)
+    return results
+
+
+@benchmark
+def timestamps(n=100000):
+    """
+    Parse n survey and n registration timestamps with the per-row code
+    that was in j60adm.parser and with j60adm.timestamps.
+    """
+    import datetime
+    from django.utils import timezone
+    from j60adm.timestamps import SURVEY_TIME, REGISTRATION_TIME
+
+    rng = random.Random(0)
+    start = datetime.datetime(2015, 1, 1)
+    times = [start + datetime.timedelta(seconds=rng.randrange(10 ** 8))
+             for _ in range(n)]
+    survey = ['%d/%d/%d %d:%02d:%02d' % (
+        t.month, t.day, t.year, t.hour, t.minute, t.second) for t in times]
+    registration = [t.strftime('%d-%m-%Y %H:%M:%S') for t in times]
+
+    def legacy_survey():
+        result = []
+        for s in survey:
+            mo = re.match(r'(\d+)/(\d+)/(\d+) (\d+):(\d+):(\d+)', s)
+            month, day, year, hour, minute, second = mo.groups()
+            tzinfo = timezone.get_default_timezone()
+            result.append(datetime.datetime(
+                int(year), int(month), int(day),
+                int(hour), int(minute), int(second), tzinfo=tzinfo))
+        return result
+
+    def legacy_registration():
+        return [datetime.datetime.strptime(
+            s, '%d-%m-%Y %H:%M:%S').replace(
+                tzinfo=timezone.get_default_timezone())
+            for s in registration]
+
+    results = collections.OrderedDict()
+    for name, fn in [
+            ('legacy survey', legacy_survey),
+            ('SURVEY_TIME', lambda: SURVEY_TIME.parse_column(survey)),
+            ('legacy registration', legacy_registration),
+            ('REGISTRATION_TIME',
+             lambda: REGISTRATION_TIME.parse_column(registration))]:
+        elapsed = best_time(fn)
+        results[name] = dict(seconds=elapsed, per_second=n / elapsed)
+    return results
+
+
+@benchmark
+def parsers(n=10000, seed=0):
+    """
+    Parse synthetic exports of n rows with each parser entry point.
+    """
+    from j60adm import parser, synthetic
+    from j60adm.titles import parse_title_at, parse_title_lines
+    from j60adm.search import parse_search_term
+
+    addresses = synthetic.address_list(n, seed)
+    survey = synthetic.survey_export(n, seed)
+    webshop = synthetic.webshop_export(n, seed)
+    titles = synthetic.title_lines(n, seed)
+    terms = [f.name.split()[0] for f in synthetic.fakes(n, seed)]
+
+    def run_iter_addresses_emails():
+        for batch in parser.iter_addresses_emails(io.StringIO(addresses)):
+            pass
+
+    def run_title_lines():
+        parse_title_at.cache_clear()
+        return parse_title_lines(titles)
+
+    results = collections.OrderedDict()
+    for name, fn in [
+            ('parse_addresses_emails',
+             lambda: parser.parse_addresses_emails(addresses)),
+            ('iter_addresses_emails', run_iter_addresses_emails),
+            ('parse_survey_responses',
+             lambda: parser.parse_survey_responses(survey)),
+            ('extract_registration_sections',
+             lambda: parser.extract_registration_sections(webshop)),
+            ('parse_registrations',
+             lambda: parser.parse_registrations(webshop)),
+            ('parse_title_lines', run_title_lines),
+            ('parse_search_term',
+             lambda: [parse_search_term(t) for t in terms])]:
+        results[name] = measure(fn, n)
+    return results
+
+
+def url_paths(samples):
+    """
+    (key, path) of each view in j60adm.urls that answers GET, except
+    EXCLUDED_URLS, with the URL arguments taken from samples, a dict of
+    model instances by argument name. The key is the path with the
+    arguments left as placeholders.
+    """
+    from django.core.urlresolvers import RegexURLPattern
+    from django.utils.regex_helper import normalize
+    from j60adm.urls import urlpatterns
+
+    for pattern in urlpatterns:
+        if not isinstance(pattern, RegexURLPattern):
+            # The included admin and auth URLs
+            continue
+        view_class = getattr(pattern.callback, 'view_class', None)
+        if pattern.name in EXCLUDED_URLS or not hasattr(view_class, 'get'):
+            continue
+        (path, params), = normalize(pattern.regex.pattern)
+        kwargs = {}
+        for param in params:
+            sample = pattern.name.split('_')[0] if param == 'pk' else param
+            kwargs[param] = samples[sample].pk
+        yield '/' + path, '/' + path % kwargs
+
+
+def get(client, path):
+    response = client.get(path)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def make_staff_client():
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    user = User.objects.create_superuser(
+        'benchmark-%s' % uuid.uuid4().hex[:8], '', None)
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+@benchmark
+def views(persons=1000, seed=0):
+    """
+    GET every URL in j60adm.urls as a staff user with a synthetic
+    population of the given size, in a transaction that is rolled back.
+    """
+    from j60adm.picker import invalidate_person_picker
+    from j60adm.synthetic import generate_population
+
+    results = collections.OrderedDict()
+    with transaction.atomic():
+        generate_population(persons, seed)
+        client = make_staff_client()
+        address = EmailAddress.objects.order_by('pk').last()
+        samples = dict(person=address.person, address=address,
+                       registration=Registration.objects.last())
+        for key, path in url_paths(samples):
+            try:
+                response = get(client, path)
+                if not 200 <= response.status_code < 400:
+                    raise ValueError('%s: %s' % (path, response.status_code))
+                result = measure(lambda: get(client, path))
+            except Exception as exn:
+                results[key] = dict(error=repr(exn))
+                continue
+            result.update(status=response.status_code,
+                          bytes=len(response.content)
+                          if not response.streaming else None)
+            results[key] = result
+        transaction.set_rollback(True)
+    # Cached pages of the person picker hold the rolled back persons
+    invalidate_person_picker()
+    return results
+
+
+@benchmark
+def person_rows(persons=1000, seed=0):
+    """
+    GET the first page of the person list as a staff user with a
+    synthetic population of the given size: cold with no rows cached,
+    warm with every row cached, and with one person changed since the
+    previous request. Runs in a transaction that is rolled back.
+    """
+    from j60adm.rowcache import get_row_cache
+    from j60adm.synthetic import generate_population
+
+    results = collections.OrderedDict()
+    with transaction.atomic():
+        generate_population(persons, seed)
+        client = make_staff_client()
+        # Not reverse('person_list'), which is also the name of j60.csv
+        path = '/'
+        first = Person.objects.order_by('title_order', 'name').first()
+
+        def cold():
+            get_row_cache().clear()
+            get(client, path)
+
+        def one_changed():
+            Person.bump_row_versions([first.pk])
+            get(client, path)
+
+        get(client, path)
+        for name, fn in [('cold', cold),
+                         ('warm', lambda: get(client, path)),
+                         ('one changed', one_changed)]:
+            results[name] = measure(fn)
+        transaction.set_rollback(True)
+    return results
+
+
+@benchmark
+def imports(n=1000, persons=1000, seed=0):
+    """
+    POST synthetic exports of n rows to each import view as a staff user
+    with a synthetic population of the given size. Each import is rolled
+    back before the next.
+    """
+    from django.core.urlresolvers import reverse
+    from j60adm import synthetic
+
+    posts = [
+        ('person_import', dict(persons=synthetic.address_list(n, seed))),
+        ('survey_response_import',
+         dict(responses=synthetic.survey_export(n, seed))),
+        ('registration_import',
+         dict(registrations=synthetic.webshop_export(n, seed))),
+        ('title_import', dict(titles=synthetic.title_lines(n, seed))),
+    ]
+    results = collections.OrderedDict()
+    with transaction.atomic():
+        synthetic.generate_population(persons, seed)
+        client = make_staff_client()
+        for name, data in posts:
+            path = reverse(name)
+
+            def run():
+                with transaction.atomic():
+                    response = client.post(path, data)
+                    transaction.set_rollback(True)
+                if response.status_code not in (200, 302):
+                    raise ValueError('%s: %s' % (path, response.status_code))
+
+            results[path] = measure(run, n)
+        transaction.set_rollback(True)
+    return results
@@ -0,0 +1,75 @@
+import collections
+
+from j60adm.models import Title, EmailMessage, Registration
+
+
+def board_titles(periods):
+    """
+    The titles of the living persons on the boards of the given periods.
+    """
+    qs = Title.objects.filter(period__in=periods)
+    qs = qs.filter(person__dead=False)
+    return qs.select_related('person')
+
+
+def board_email_addresses(person_ids):
+    """
+    (person id, address) of the addresses of the given persons that
+    were sent a message that did not bounce, by address.
+    """
+    qs = EmailMessage.objects.filter(
+        recipient__person__in=person_ids, bounce=False)
+    qs = qs.order_by('recipient__address')
+    return qs.values_list('recipient__person_id', 'recipient__address')
+
+
+def board_registrations(person_ids):
+    qs = Registration.objects.filter(person__in=person_ids)
+    return qs.values_list('person_id', flat=True)
+
+
+def person_boards(person):
+    """
+    For each title of person, the other members of that board, split
+    into the registered ones, the ones with an email address to
+    remind and the ones without.
+    """
+    titles = list(person.title_set.order_by('period'))
+    qs = board_titles([t.period for t in titles])
+    board_titles_by_period = collections.defaultdict(list)
+    for board_title in qs:
+        board_titles_by_period[board_title.period].append(board_title)
+    board_person_ids = set(t.person_id for t in qs)
+
+    # First non-bounced address of each board member
+    email_addresses = {}
+    for person_id, address in board_email_addresses(board_person_ids):
+        email_addresses.setdefault(person_id, address)
+
+    registered_ids = set(board_registrations(board_person_ids))
+
+    boards = []
+    for title in titles:
+        year = '%04d/%02d' % (title.period, (title.period + 1) % 100)
+        not_registered = []
+        no_email = []
+        registered = []
+        for board_title in board_titles_by_period[title.period]:
+            if board_title.pk == title.pk:
+                continue
+            board_person = board_title.person
+            name = '%s %s' % (board_title.title, board_person.name)
+            email_address = email_addresses.get(board_person.pk)
+
+            if board_person.pk in registered_ids:
+                registered.append(
+                    dict(name=name, email=email_address))
+            elif email_address is not None:
+                not_registered.append(
+                    dict(name=name, email=email_address))
+            else:
+                no_email.append(dict(name=name))
+        boards.append(dict(
+            year=year, not_registered=not_registered,
+            no_email=no_email, registered=registered))
+    return boards
@@ -1,18 +1,37 @@
 import re
+import codecs
 from django import forms
 from django.core.exceptions import ValidationError
 
 from j60adm.models import Registration
 from j60adm.parser import (
-    parse_registrations, parse_survey_responses, parse_addresses_emails)
+    parse_registrations, parse_survey_responses, parse_addresses_emails,
+    iter_addresses_emails, read_registrations)
 
 
 class PersonImportForm(forms.Form):
-    persons = forms.CharField(widget=forms.Textarea, strip=False)
+    persons = forms.CharField(widget=forms.Textarea, strip=False,
+                              required=False)
+    file = forms.FileField(required=False)
+    dry_run = forms.BooleanField(required=False)
 
     def clean_persons(self):
         csv_text = self.cleaned_data['persons']
-        return parse_addresses_emails(csv_text)
+        if csv_text:
+            return parse_addresses_emails(csv_text)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('file'):
+            # Parsed lazily while importing, so errors in the file
+            # are raised from the iterator and not from is_valid().
+            lines = codecs.iterdecode(cleaned_data['file'], 'utf-8-sig')
+            cleaned_data['batches'] = iter_addresses_emails(lines)
+        elif cleaned_data.get('persons'):
+            cleaned_data['batches'] = [cleaned_data['persons']]
+        elif not self.errors:
+            raise ValidationError("Paste the address list or upload a file")
+        return cleaned_data
 
 
 class PersonNoteUpdateForm(forms.Form):
@@ -20,11 +39,26 @@ class PersonNoteUpdateForm(forms.Form):
 
 
 class RegistrationImportForm(forms.Form):
-    registrations = forms.CharField(widget=forms.Textarea, strip=False)
+    registrations = forms.CharField(widget=forms.Textarea, strip=False,
+                                    required=False)
+    file = forms.FileField(required=False)
 
     def clean_registrations(self):
         csv_text = self.cleaned_data['registrations']
-        return parse_registrations(csv_text)
+        if csv_text:
+            return parse_registrations(csv_text)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('file'):
+            lines = codecs.iterdecode(cleaned_data['file'], 'utf-8-sig')
+            try:
+                cleaned_data['registrations'] = read_registrations(lines)
+            except ValidationError as e:
+                self.add_error('file', e)
+        elif not cleaned_data.get('registrations') and not self.errors:
+            raise ValidationError("Paste the webshop export or upload a file")
+        return cleaned_data
 
 
 class RegistrationShowForm(forms.ModelForm):
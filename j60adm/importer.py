@@ -0,0 +1,318 @@
+import time
+import collections
+
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Case, When, Value, CharField
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from j60adm.models import (
+    Association, Person, Title, EmailAddress, EmailMessage, Registration,
+)
+from j60adm.titles import parse_title_line
+from j60adm.linking import chunks
+from j60adm.picker import invalidate_person_picker
+
+
+BATCH_SIZE = 500
+
+
+class ImportReport(collections.namedtuple(
+        'ImportReport',
+        'persons titles email_addresses email_messages elapsed dry_run')):
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return float(self.persons)
+        return self.persons / self.elapsed
+
+    def __str__(self):
+        return ('%s persons, %s titles, %s addresses, %s messages ' +
+                'in %.2f s (%.0f rows/s)%s') % (
+                    self.persons, self.titles, self.email_addresses,
+                    self.email_messages, self.elapsed, self.rows_per_second,
+                    ' [dry run]' if self.dry_run else '')
+
+
+def lock_for_insert(model):
+    """
+    Keep other connections from inserting into the table of model until
+    the current transaction ends. On SQLite, any write statement takes
+    the lock on the whole database, so run an UPDATE matching no rows.
+    Other databases are not supported, so imports must not run
+    concurrently there.
+    """
+    if not connection.in_atomic_block:
+        raise transaction.TransactionManagementError(
+            "lock_for_insert() outside of a transaction")
+    if connection.vendor == 'sqlite':
+        qn = connection.ops.quote_name
+        pk = qn(model._meta.pk.column)
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE %s SET %s = %s WHERE 0 = 1' % (
+                qn(model._meta.db_table), pk, pk))
+
+
+def bulk_create_with_ids(model, objs, batch_size=BATCH_SIZE):
+    """
+    Like model.objects.bulk_create(objs), but also set the primary key
+    of each inserted object, so children can refer to it afterwards.
+    Must be called inside a transaction.
+
+    Django does not return autoincrement ids from bulk inserts, so we read
+    back every row with an id above the previous maximum. This relies on
+    the ids being assigned in insertion order and on no other connection
+    inserting between reading the maximum and the inserts, so the
+    maximum is only read once lock_for_insert() holds the write lock.
+    If the number of ids read back still differs, IntegrityError is
+    raised.
+    """
+    if not objs:
+        return objs
+    lock_for_insert(model)
+    qs = model.objects.order_by('-pk').values_list('pk', flat=True)
+    last_pk = qs.first() or 0
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    qs = model.objects.filter(pk__gt=last_pk).order_by('pk')
+    pks = list(qs.values_list('pk', flat=True))
+    if len(pks) != len(objs):
+        raise IntegrityError(
+            "Inserted %s %s rows but read back %s ids" %
+            (len(objs), model.__name__, len(pks)))
+    for o, pk in zip(objs, pks):
+        o.pk = pk
+    return objs
+
+
+class PersonImporter:
+    """
+    Insert the output of parse_addresses_emails() in bulk, one model
+    at a time, fixing up foreign keys once the parents have ids.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.counts = collections.Counter()
+
+    def add(self, persons, objects, messages):
+        bulk_create_with_ids(Person, persons, self.batch_size)
+        self.counts[Person] += len(persons)
+
+        by_model = collections.defaultdict(list)
+        for o in objects:
+            o.person_id = o.person.pk
+            by_model[type(o)].append(o)
+        bulk_create_with_ids(
+            EmailAddress, by_model[EmailAddress], self.batch_size)
+        bulk_create_with_ids(Title, by_model[Title], self.batch_size)
+        for model, objs in by_model.items():
+            self.counts[model] += len(objs)
+
+        # bulk_create() bypasses Person.save(), so fill in the cached
+        # fields now that the titles have ids
+        titles = collections.defaultdict(list)
+        for t in by_model[Title]:
+            titles[t.person_id].append(t)
+        Person.write_cached_fields({
+            p.pk: Person.compute_cached_fields(p, titles[p.pk])
+            for p in persons})
+
+        for m in messages:
+            m.recipient_id = m.recipient.pk
+        EmailMessage.objects.bulk_create(messages, self.batch_size)
+        self.counts[EmailMessage] += len(messages)
+
+    def report(self, elapsed, dry_run):
+        return ImportReport(
+            persons=self.counts[Person],
+            titles=self.counts[Title],
+            email_addresses=self.counts[EmailAddress],
+            email_messages=self.counts[EmailMessage],
+            elapsed=elapsed, dry_run=dry_run)
+
+
+def import_persons(batches, dry_run=False, batch_size=BATCH_SIZE):
+    """
+    Import an iterable of (persons, objects, messages) batches
+    in a single transaction and return an ImportReport.
+
+    If dry_run is true, everything is inserted and then rolled back,
+    so database errors are still reported but nothing is stored.
+    """
+    importer = PersonImporter(batch_size=batch_size)
+    t0 = time.time()
+    with transaction.atomic():
+        for persons, objects, messages in batches:
+            importer.add(persons, objects, messages)
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            invalidate_person_picker()
+    return importer.report(time.time() - t0, dry_run)
+
+
+class TitleImportLine(collections.namedtuple(
+        'TitleImportLine',
+        'number line status person created matched message')):
+    """
+    Outcome of one line of import_titles(). status is one of
+    'created', 'matched', 'conflict', 'error' or 'skipped'.
+    """
+
+
+def import_titles(text):
+    """
+    Add the titles on each line of text to the one person who already
+    has some of them. Return a TitleImportLine for each line.
+
+    Existing titles are looked up with a single query, and lines with
+    errors or conflicts are reported instead of aborting the import.
+    The lookup and the insert happen in one transaction, so the report
+    matches what was stored.
+    """
+    current_period = Association.get().current_period
+    parsed = []
+    for number, line in enumerate(text.splitlines(), 1):
+        try:
+            titles = parse_title_line(line, current_period)
+        except ValidationError as exn:
+            titles = exn
+        parsed.append((number, line, titles))
+
+    with transaction.atomic():
+        keys = set(k for _, _, titles in parsed if isinstance(titles, list)
+                   for k in titles)
+        qs = Title.objects.filter(period__in=set(p for p, t in keys),
+                                  title__in=set(t for p, t in keys))
+        qs = qs.select_related('person')
+        existing = collections.defaultdict(list)
+        for t in qs:
+            existing[t.period, t.title].append(t.person)
+
+        report = []
+        create = []
+        for number, line, titles in parsed:
+            if isinstance(titles, ValidationError):
+                report.append(TitleImportLine(
+                    number, line, 'error', None, [], [],
+                    '; '.join(titles.messages)))
+                continue
+            if len(titles) <= 1:
+                report.append(TitleImportLine(
+                    number, line, 'skipped', None, [], [], ''))
+                continue
+            matched = [Title(period=p, title=t) for p, t in titles
+                       if (p, t) in existing]
+            new = [Title(period=p, title=t) for p, t in titles
+                   if (p, t) not in existing]
+            persons = set(p for t in matched
+                          for p in existing[t.period, t.title])
+            if len(persons) != 1:
+                report.append(TitleImportLine(
+                    number, line, 'conflict', None, new, matched,
+                    'Persons with these titles: %s' %
+                    (', '.join(str(p) for p in persons) or 'none',)))
+                continue
+            person, = persons
+            for t in new:
+                t.person = person
+                existing[t.period, t.title].append(person)
+            create.extend(new)
+            report.append(TitleImportLine(
+                number, line, 'created' if new else 'matched', person,
+                new, matched, ''))
+
+        Title.objects.bulk_create(create)
+        person_ids = set(t.person_id for t in create)
+        Person.update_cached_fields(person_ids)
+        Person.bump_row_versions(person_ids)
+        if create:
+            invalidate_person_picker()
+    return report
+
+
+RegistrationImportReport = collections.namedtuple(
+    'RegistrationImportReport', 'created updated unchanged')
+
+
+def registrations_by_survey_id(survey_ids):
+    return Registration.objects.filter(survey_id__in=survey_ids)
+
+
+def import_registrations(registrations):
+    """
+    Insert or update the parsed registrations by survey_id.
+
+    Registrations whose import_hash matches the stored one are skipped
+    without being loaded. The others must agree with the stored
+    registration except that the show may change to 'refund'; any
+    disagreement raises ValidationError and nothing is stored.
+    New registrations are then inserted with one bulk insert and the
+    changed ones updated with one UPDATE per chunk. The lookup and the
+    writes happen in one transaction, so a registration stored by a
+    concurrent import is reported as a ValidationError.
+    """
+    by_id = collections.OrderedDict()
+    for reg in registrations:
+        reg.import_hash = reg.compute_import_hash()
+        by_id[reg.survey_id] = reg
+
+    with transaction.atomic():
+        stored = {}
+        for chunk in chunks(by_id):
+            qs = registrations_by_survey_id(chunk)
+            stored.update(qs.values_list('survey_id', 'import_hash'))
+        create = [reg for i, reg in by_id.items() if i not in stored]
+        changed = [i for i, h in stored.items()
+                   if h != by_id[i].import_hash]
+
+        errors = []
+        update = []
+        keys = ('first_name', 'last_name', 'email', 'dietary',
+                'newsletter', 'transportation')
+        for chunk in chunks(changed):
+            qs = registrations_by_survey_id(chunk)
+            for ex in qs.select_for_update():
+                reg = by_id[ex.survey_id]
+                # Don't bother with time since timezones are hard
+                for k in keys:
+                    if getattr(ex, k) != getattr(reg, k):
+                        errors.append(
+                            'Entry %s differs on %s: %s != %s' %
+                            (reg.survey_id, k, getattr(ex, k),
+                             getattr(reg, k)))
+                if ex.webshop_show != reg.webshop_show:
+                    # If the show attribute changed,
+                    # it must have changed to 'refund'
+                    if reg.webshop_show != 'refund':
+                        errors.append(
+                            'Entry %s: Show changed from %s to %s' %
+                            (reg.survey_id, ex.webshop_show,
+                             reg.webshop_show))
+                    ex.webshop_show = reg.webshop_show
+                    ex.note += reg.note
+                ex.import_hash = reg.import_hash
+                update.append(ex)
+        if errors:
+            raise ValidationError(errors)
+
+        now = timezone.now()
+        try:
+            Registration.objects.bulk_create(create, BATCH_SIZE)
+        except IntegrityError:
+            raise ValidationError(
+                'Another import stored some of these registrations; ' +
+                'try again')
+        # Three CASE expressions of two parameters per registration
+        for chunk in chunks(update, 100):
+            values = {
+                f: Case(*[When(pk=r.pk, then=Value(getattr(r, f)))
+                          for r in chunk], output_field=CharField())
+                for f in ('webshop_show', 'note', 'import_hash')}
+            Registration.objects.filter(
+                pk__in=[r.pk for r in chunk]).update(
+                    updated_time=now, **values)
+        Person.bump_row_versions(r.person_id for r in create + update)
+    return RegistrationImportReport(
+        created=len(create), updated=len(update),
+        unchanged=len(stored) - len(update))
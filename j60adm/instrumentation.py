@@ -0,0 +1,238 @@
+import os
+import re
+import copy
+import fcntl
+import glob
+import math
+import json
+import time
+import queue
+import datetime
+import logging.handlers
+
+from django.conf import settings
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format a record as a line of JSON holding the time, level, logger
+    and message, and the attributes given in extra.
+    """
+
+    standard_attributes = (
+        frozenset(logging.makeLogRecord({}).__dict__) |
+        {'message', 'asctime'})
+
+    def format(self, record):
+        data = dict(
+            time=datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc).isoformat(),
+            level=record.levelname,
+            logger=record.name,
+            message=record.getMessage())
+        for k, v in record.__dict__.items():
+            if k not in self.standard_attributes:
+                data[k] = v
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, sort_keys=True)
+
+
+class CountingCursor:
+    """
+    DB-API cursor that adds each statement it executes to a QueryCounter.
+    """
+
+    def __init__(self, cursor, counter):
+        self.cursor = cursor
+        self.counter = counter
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return self.cursor.execute(*args)
+        finally:
+            self.counter.add(time.perf_counter() - start)
+
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return self.cursor.executemany(*args)
+        finally:
+            self.counter.add(time.perf_counter() - start)
+
+
+class QueryCounter:
+    """
+    Number and total time of the statements executed on a connection
+    while the counter is installed on it. Unlike the debug cursor it
+    neither formats nor keeps the SQL, and it has no limit.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.time += duration
+
+    def install(self, connection):
+        # Replaces a counter an earlier request failed to uninstall
+        create_cursor = type(connection)._cursor
+        connection._cursor = (
+            lambda: CountingCursor(create_cursor(connection), self))
+
+    @staticmethod
+    def uninstall(connection):
+        connection.__dict__.pop('_cursor', None)
+
+
+class SharedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that several processes can append to.
+
+    The rollover is done under an exclusive lock on filename + '.lock',
+    and only if no other process rotated the file while we waited for
+    the lock, so it is rotated once however many processes find it too
+    big. Each process reopens the file once another one rotated it, so
+    a backup may end with a few lines written after the rollover.
+    """
+
+    def __init__(self, filename, **kwargs):
+        # Inode of the file self.stream writes to
+        self.ino = None
+        super().__init__(filename, **kwargs)
+        self.lock_filename = self.baseFilename + '.lock'
+
+    def _open(self):
+        stream = super()._open()
+        self.ino = os.fstat(stream.fileno()).st_ino
+        return stream
+
+    def file_size(self):
+        try:
+            st = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    def shouldRollover(self, record):
+        if self.maxBytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        ino, size = self.file_size()
+        if ino != self.ino:
+            # Rotated by another process
+            self.stream.close()
+            self.stream = self._open()
+            ino, size = self.file_size()
+        msg = '%s\n' % self.format(record)
+        return size + len(msg.encode(self.encoding or 'utf8')) > self.maxBytes
+
+    def doRollover(self):
+        with open(self.lock_filename, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            ino, size = self.file_size()
+            if ino == self.ino:
+                # No other process rotated it while we waited for the lock
+                super().doRollover()
+            else:
+                self.stream.close()
+                self.stream = self._open()
+
+
+class QueueRotatingFileHandler(logging.handlers.QueueHandler):
+    """
+    Format records in the thread logging them and pass them over a queue
+    to a background thread writing them to a SharedRotatingFileHandler,
+    so a request never waits for the disk. The thread is started by the
+    first record logged in each process.
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0,
+                 encoding='utf8'):
+        super().__init__(queue.Queue())
+        self.target = SharedRotatingFileHandler(
+            filename, maxBytes=maxBytes, backupCount=backupCount,
+            encoding=encoding, delay=True)
+        self.listener = None
+        self.pid = None
+
+    def prepare(self, record):
+        # A copy holding only the formatted line, so the target writes
+        # it as is and other handlers still see the original record
+        record = copy.copy(record)
+        record.msg = self.format(record)
+        record.args = None
+        record.exc_info = record.exc_text = record.stack_info = None
+        return record
+
+    def enqueue(self, record):
+        # Called with the handler lock held
+        if self.listener is None or self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.listener = logging.handlers.QueueListener(
+                self.queue, self.target)
+            self.listener.start()
+        super().enqueue(record)
+
+    def close(self):
+        if self.listener is not None and self.pid == os.getpid():
+            # Writes the records still in the queue
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
+
+
+def get_request_log_filenames():
+    """
+    The backups of the request log made by SharedRotatingFileHandler
+    (requests.log.1 is the newest), followed by the log itself,
+    oldest first.
+    """
+    filename = settings.LOGGING['handlers']['requests']['filename']
+    pattern = re.compile(r'^\.(\d+)$')
+    backups = []
+    for backup in glob.glob(glob.escape(filename) + '.*'):
+        mo = pattern.match(backup[len(filename):])
+        if mo is not None:
+            backups.append((int(mo.group(1)), backup))
+    backups.sort(reverse=True)
+    filenames = [backup for i, backup in backups]
+    if os.path.exists(filename):
+        filenames.append(filename)
+    return filenames
+
+
+def read_request_log():
+    """
+    Yield the entries of the request log and its backups as dicts.
+    """
+    for filename in get_request_log_filenames():
+        with open(filename, encoding='utf8') as fp:
+            for line in fp:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Cut off by a crash
+                    pass
+
+
+def percentile(values, p):
+    """
+    The nearest-rank p-th percentile of a nonempty list of values.
+
+    >>> percentile([4, 1, 3, 2], 50), percentile([4, 1, 3, 2], 95)
+    (2, 4)
+    """
+    values = sorted(values)
+    return values[max(math.ceil(len(values) * p / 100) - 1, 0)]
@@ -0,0 +1,106 @@
+import collections
+
+from django.db import transaction
+from django.db.models import Case, When, Value, IntegerField
+from django.utils import timezone
+
+from j60adm.models import Person
+
+
+# Keep IN lists and CASE expressions below SQLite's 999 parameter limit
+CHUNK_SIZE = 200
+
+PersonChange = collections.namedtuple('PersonChange', 'pk old new')
+
+
+def chunks(values, n=CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), n):
+        yield values[i:i + n]
+
+
+def parse_person_assignments(data, prefix='object_'):
+    """
+    Extract {object id: person id} from the "object_<id>" fields of a
+    submitted form. Empty and malformed values are ignored.
+
+    >>> sorted(parse_person_assignments(
+    ...     {'object_3': '7', 'object_4': '', 'object_x': '1',
+    ...      'object_5': 'y', 'csrfmiddlewaretoken': 'z'}).items())
+    [(3, 7)]
+    """
+    assignments = {}
+    for k, v in data.items():
+        if not k.startswith(prefix) or not v:
+            continue
+        try:
+            assignments[int(k[len(prefix):])] = int(v)
+        except ValueError:
+            continue
+    return assignments
+
+
+def reassign_persons(model, assignments):
+    """
+    Link the rows of model (Registration or SurveyResponse) to persons
+    according to assignments {pk: person id}. Only the given rows are
+    fetched, and the changed ones are updated with one UPDATE per chunk
+    inside a single transaction. Return a PersonChange for each change.
+    """
+    person_ids = set()
+    for chunk in chunks(set(assignments.values())):
+        qs = Person.objects.filter(pk__in=chunk)
+        person_ids.update(qs.values_list('pk', flat=True))
+
+    changes = []
+    with transaction.atomic():
+        for chunk in chunks(sorted(assignments)):
+            qs = model.objects.filter(pk__in=chunk)
+            for pk, old in qs.values_list('pk', 'person_id'):
+                new = assignments[pk]
+                if new != old and new in person_ids:
+                    changes.append(PersonChange(pk, old, new))
+        now = timezone.now()
+        for chunk in chunks(changes):
+            person_id = Case(
+                *[When(pk=c.pk, then=Value(c.new)) for c in chunk],
+                output_field=IntegerField())
+            model.objects.filter(pk__in=[c.pk for c in chunk]).update(
+                person_id=person_id, updated_time=now)
+        Person.bump_row_versions(
+            [c.old for c in changes] + [c.new for c in changes])
+    return changes
+
+
+def parse_person_form(data):
+    """
+    Extract {object id: person id} from a submitted person list:
+    the "object_<id>" fields, where the person id is typed in, and the
+    chosen "suggestion_<id>" radio buttons. A typed person id beats a
+    suggestion for the same row.
+
+    >>> sorted(parse_person_form(
+    ...     {'object_3': '7', 'suggestion_3': '8',
+    ...      'object_4': '', 'suggestion_4': '9',
+    ...      'object_5': '', 'suggestion_5': ''}).items())
+    [(3, 7), (4, 9)]
+    """
+    assignments = parse_person_assignments(data, 'suggestion_')
+    assignments.update(parse_person_assignments(data))
+    return assignments
+
+
+def reassign_persons_from_form(model, data):
+    """
+    reassign_persons() of model according to parse_person_form(data).
+    """
+    return reassign_persons(model, parse_person_form(data))
+
+
+def format_person_changes(changes):
+    """
+    >>> format_person_changes(
+    ...     [PersonChange(1, None, 5), PersonChange(2, 3, 4)])
+    '1: None -> 5, 2: 3 -> 4'
+    """
+    return ', '.join('%s: %s -> %s' % c for c in changes)
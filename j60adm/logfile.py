@@ -0,0 +1,193 @@
+import os
+import re
+import time
+
+from django.conf import settings
+
+
+# Bytes read at a time when searching backwards from the end of the log
+BLOCK_SIZE = 64 * 1024
+
+# How long a follow request waits for the log to grow, and how often
+# it checks the size of the file meanwhile
+FOLLOW_TIMEOUT = 25
+FOLLOW_INTERVAL = 0.5
+
+# Start of a record written with the 'simple' formatter in settings.
+# Lines not matching are continuations (e.g. tracebacks) of the record
+# before them.
+record_pattern = re.compile(
+    br'\[\S+ \S+ \S+ \S+ (?P<ip>\S+) (?P<user>[^\]]*)\] ')
+
+
+def get_log_filename():
+    return settings.LOGGING['handlers']['file']['filename']
+
+
+def open_log():
+    return open(get_log_filename(), 'rb')
+
+
+def get_size(fp):
+    return os.fstat(fp.fileno()).st_size
+
+
+def complete_end(fp, end):
+    """
+    Offset just after the last newline before end, so a line still
+    being written is left for the next read.
+
+    >>> from io import BytesIO
+    >>> complete_end(BytesIO(b'a\\nb\\nc'), 5)
+    4
+    """
+    pos = end
+    while pos > 0:
+        start = max(pos - BLOCK_SIZE, 0)
+        fp.seek(start)
+        i = fp.read(pos - start).rfind(b'\n')
+        if i != -1:
+            return start + i + 1
+        pos = start
+    return 0
+
+
+def tail_offset(fp, lines, end):
+    """
+    Offset of the first of the last lines lines that end before end,
+    found by reading blocks backwards from end.
+
+    >>> from io import BytesIO
+    >>> fp = BytesIO(b'a\\nb\\nc\\n')
+    >>> tail_offset(fp, 2, 6), tail_offset(fp, 5, 6), tail_offset(fp, 0, 6)
+    (2, 0, 6)
+    """
+    if lines <= 0:
+        return end
+    # The newline ending the last line does not start a line
+    pos = end - 1
+    while pos > 0:
+        start = max(pos - BLOCK_SIZE, 0)
+        fp.seek(start)
+        block = fp.read(pos - start)
+        i = len(block)
+        while True:
+            i = block.rfind(b'\n', 0, i)
+            if i == -1:
+                break
+            lines -= 1
+            if lines == 0:
+                return start + i + 1
+        pos = start
+    return 0
+
+
+def line_start(fp, offset):
+    """
+    Offset of the first line starting at or after offset.
+
+    >>> from io import BytesIO
+    >>> fp = BytesIO(b'ab\\ncd\\n')
+    >>> line_start(fp, 0), line_start(fp, 1), line_start(fp, 3)
+    (0, 3, 3)
+    """
+    if offset <= 0:
+        return 0
+    fp.seek(offset - 1)
+    if fp.read(1) != b'\n':
+        fp.readline()
+    return fp.tell()
+
+
+def iter_lines(fp, start, end):
+    """
+    Yield the lines of fp from start to end. Both must be line starts.
+    """
+    fp.seek(start)
+    remaining = end - start
+    for line in fp:
+        if len(line) > remaining:
+            break
+        remaining -= len(line)
+        yield line
+
+
+def filter_lines(lines, user=None, ip=None):
+    """
+    Keep the records, with their continuation lines, logged by the
+    given user and from the given IP address.
+
+    >>> lines = [b'[2016-06-03 22:38:50,123 j60adm INFO 127.0.0.1 bo] A\\n',
+    ...          b'Traceback\\n',
+    ...          b'[2016-06-03 22:38:51,456 j60adm INFO ::1 anon] B\\n']
+    >>> [line[-2:] for line in filter_lines(lines, user='bo')]
+    [b'A\\n', b'k\\n']
+    >>> [line[-2:] for line in filter_lines(lines, ip='::1')]
+    [b'B\\n']
+    """
+    if user is not None:
+        user = user.encode('utf8')
+    if ip is not None:
+        ip = ip.encode('utf8')
+    keep = user is None and ip is None
+    for line in lines:
+        mo = record_pattern.match(line)
+        if mo:
+            keep = ((user is None or mo.group('user') == user) and
+                    (ip is None or mo.group('ip') == ip))
+        if keep:
+            yield line
+
+
+def wait_for_growth(fp, offset, timeout=None):
+    """
+    Wait until fp has a complete line after offset, or for timeout
+    seconds (FOLLOW_TIMEOUT by default). Return the size of the file.
+    """
+    if timeout is None:
+        timeout = FOLLOW_TIMEOUT
+    deadline = time.time() + timeout
+    while True:
+        size = get_size(fp)
+        if size < offset or complete_end(fp, size) > offset:
+            return size
+        if time.time() >= deadline:
+            return size
+        time.sleep(FOLLOW_INTERVAL)
+
+
+class LogRange:
+    """
+    The complete lines of the log between two byte offsets, chosen from
+    the optional start, end and tail (number of lines before end).
+    An offset past the end of the file, as after the log was rotated,
+    restarts from the beginning. With follow, wait for lines after start
+    before reading. The file is only open while the offsets are computed
+    and while lines() is iterated, so a response that is never consumed
+    does not keep it open.
+    """
+
+    def __init__(self, start=None, end=None, tail=None, follow=False):
+        with open_log() as fp:
+            size = get_size(fp)
+            if start is not None and start > size:
+                start = 0
+            if follow and start is not None:
+                size = wait_for_growth(fp, start)
+                if start > size:
+                    start = 0
+            self.end = complete_end(
+                fp, size if end is None else min(end, size))
+            self.start = min(line_start(fp, start or 0), self.end)
+            if tail is not None:
+                self.start = max(self.start,
+                                 tail_offset(fp, tail, self.end))
+
+    def lines(self, user=None, ip=None):
+        with open_log() as fp:
+            if get_size(fp) < self.end:
+                # Rotated since the offsets were computed
+                return
+            lines = iter_lines(fp, self.start, self.end)
+            for line in filter_lines(lines, user=user, ip=ip):
+                yield line
@@ -0,0 +1,90 @@
+import json
+import inspect
+import platform
+import subprocess
+import collections
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from j60adm.benchmarks import BENCHMARKS
+
+
+def get_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Run the named benchmarks, or all of them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='name',
+                            help=', '.join(BENCHMARKS))
+        parser.add_argument('--persons', type=int,
+                            help='Size of the synthetic population ' +
+                            '(e.g. 1000, 10000 or 100000)')
+        parser.add_argument('--seed', type=int,
+                            help='Seed of the synthetic data')
+        parser.add_argument('--json', metavar='FILE',
+                            help='Write the results as JSON to FILE')
+        parser.add_argument('--compare', metavar='FILE',
+                            help='Compare the times with the results ' +
+                            'in FILE written by --json')
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(BENCHMARKS)
+        for name in names:
+            if name not in BENCHMARKS:
+                raise CommandError('Unknown benchmark %r' % (name,))
+        previous = {}
+        if options['compare']:
+            with open(options['compare']) as fp:
+                previous = json.load(fp)['benchmarks']
+        kwargs = {k: options[k] for k in ('persons', 'seed')
+                  if options[k] is not None}
+        results = collections.OrderedDict()
+        for name in names:
+            self.stdout.write(name)
+            fn = BENCHMARKS[name]
+            params = inspect.signature(fn).parameters
+            results[name] = fn(
+                **{k: v for k, v in kwargs.items() if k in params})
+            for case, result in results[name].items():
+                self.write_result(case, result,
+                                  previous.get(name, {}).get(case))
+        if options['json']:
+            with open(options['json'], 'w') as fp:
+                json.dump(collections.OrderedDict([
+                    ('revision', get_revision()),
+                    ('time', timezone.now().isoformat()),
+                    ('python', platform.python_version()),
+                    ('django', django.get_version()),
+                    ('options', kwargs),
+                    ('benchmarks', results),
+                ]), fp, indent=2)
+        failed = ['%s %s' % (name, case)
+                  for name, cases in results.items()
+                  for case, result in cases.items() if 'error' in result]
+        if failed:
+            raise CommandError('Failed: %s' % ', '.join(failed))
+
+    def write_result(self, case, result, previous):
+        if 'error' in result:
+            self.stdout.write('  %-32s %s' % (case, result['error']))
+            return
+        line = '  %-32s %8.3f s %12.0f/s' % (
+            case, result['seconds'], result['per_second'])
+        if 'queries' in result:
+            line += ' %6d queries %8.1f MB' % (
+                result['queries'], result['peak_memory'] / 1e6)
+        if previous and 'seconds' in previous:
+            line += ' %+6.0f%%' % (
+                100 * (result['seconds'] / previous['seconds'] - 1))
+        self.stdout.write(line)
@@ -0,0 +1,96 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from j60adm.models import Person, EmailAddress, AddressSynchronization
+from j60adm.addresses import synchronization_sources, email_state_rows
+from j60adm.boards import (
+    board_titles, board_email_addresses, board_registrations,
+)
+from j60adm.importer import registrations_by_survey_id
+from j60adm.search import search_persons
+
+
+# A plan step that reads the whole table instead of using an index,
+# e.g. "SCAN TABLE j60adm_person" or "SCAN j60adm_person".
+full_scan_pattern = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def audited_queries():
+    """
+    (description, queryset, tables) of the lookups done by the views,
+    built with the same helpers as the views, that should be answered
+    from an index, except that they may scan the given tables.
+    """
+    person = Person(pk=1)
+    now = timezone.now()
+    source_queries = [
+        ('%s changed since' % source, qs, ())
+        for qs, source in synchronization_sources(now)]
+    return [
+        # PersonMessage
+        ('Titles of a person',
+         person.title_set.order_by('period'), ()),
+        ('Board titles of periods',
+         board_titles([2014, 2015]), ()),
+        ('Board email addresses',
+         board_email_addresses([1, 2]), ()),
+        ('Board registrations',
+         board_registrations([1, 2]), ()),
+        # PersonList
+        ('First page of the person list',
+         search_persons('')[:100], ()),
+        ('Person list search by period',
+         search_persons('2015')[:100], ()),
+        ('Person list search by title',
+         search_persons('GKASS')[:100], ()),
+        # The name is matched anywhere, which no index can answer
+        ('Person list search by name',
+         search_persons('anders')[:100], ('j60adm_person',)),
+        # EmailSummary counts every person
+        ('Email states',
+         email_state_rows(), ('j60adm_person',)),
+        # import_registrations
+        ('Registrations by survey_id',
+         registrations_by_survey_id(['1', '2']), ()),
+        # synchronize_addresses
+        ('Latest address synchronization',
+         AddressSynchronization.objects.order_by('-time')[:1], ()),
+    ] + source_queries + [
+        ('Email addresses by address',
+         EmailAddress.objects.filter(address__in=['a@example.com']), ()),
+        ('Persons with bounced letters',
+         Person.objects.filter(letter_bounced=True), ()),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Run EXPLAIN QUERY PLAN on the hot lookups and fail ' +
+            'if any of them scans a whole table.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN requires SQLite, not %s' %
+                               (connection.vendor,))
+        failures = []
+        with connection.cursor() as cursor:
+            for description, qs, tables in audited_queries():
+                sql, params = qs.query.sql_with_params()
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = [row[-1] for row in cursor.fetchall()]
+                scans = [mo.group(1) for mo in map(full_scan_pattern.match,
+                                                   plan)
+                         if mo and mo.group(1) not in tables]
+                if scans:
+                    failures.append('%s (%s)' % (description,
+                                                 ', '.join(scans)))
+                self.stdout.write('%-4s %s' % (
+                    'SCAN' if scans else 'OK', description))
+                if options['verbosity'] > 1:
+                    for step in plan:
+                        self.stdout.write('     %s' % (step,))
+        if failures:
+            raise CommandError('Full table scan in: %s' %
+                               '; '.join(failures))
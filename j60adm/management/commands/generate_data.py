@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from j60adm.synthetic import SIZES, generate_population
+
+
+class Command(BaseCommand):
+    help = ('Add a seeded synthetic population of persons with titles, ' +
+            'email addresses, registrations and survey responses.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--persons', type=int, default=SIZES[0],
+                            help='Number of persons (benchmarks use %s)' %
+                            ', '.join(map(str, SIZES)))
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        counts = generate_population(options['persons'], options['seed'])
+        for model, count in counts.items():
+            self.stdout.write('%-20s %8d' % (model, count))
@@ -0,0 +1,29 @@
+import codecs
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.exceptions import ValidationError
+
+from j60adm.importer import import_persons, BATCH_SIZE
+from j60adm.parser import iter_addresses_emails
+
+
+class Command(BaseCommand):
+    help = 'Import the tab-separated address list into the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename')
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with open(options['filename'], 'rb') as fp:
+            lines = codecs.iterdecode(fp, options['encoding'])
+            batches = iter_addresses_emails(lines, batch_size=batch_size)
+            try:
+                report = import_persons(batches, dry_run=options['dry_run'],
+                                        batch_size=batch_size)
+            except ValidationError as exn:
+                raise CommandError('; '.join(exn.messages))
+        self.stdout.write(str(report))
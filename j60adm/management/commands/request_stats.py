@@ -0,0 +1,41 @@
+import collections
+
+from django.core.management.base import BaseCommand
+
+from j60adm.instrumentation import read_request_log, percentile
+
+
+class Command(BaseCommand):
+    help = ('Summarize the request log by view, ' +
+            'slowest total time first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('views', nargs='*', metavar='view',
+                            help='Only these views')
+
+    def handle(self, *args, **options):
+        entries = collections.defaultdict(list)
+        for entry in read_request_log():
+            if 'duration' not in entry:
+                continue
+            view = entry.get('view') or entry.get('path')
+            if options['views'] and view not in options['views']:
+                continue
+            entries[view].append(entry)
+
+        def total(view):
+            return sum(e['duration'] for e in entries[view])
+
+        self.stdout.write('%-28s %6s %8s %8s %8s %8s %10s' % (
+            'view', 'count', 'median', 'p95', 'max', 'queries', 'bytes'))
+        for view in sorted(entries, key=total, reverse=True):
+            durations = [e['duration'] for e in entries[view]]
+            n = len(durations)
+            self.stdout.write(
+                '%-28s %6d %6.0fms %6.0fms %6.0fms %8.1f %10.0f' % (
+                    view, n,
+                    1000 * percentile(durations, 50),
+                    1000 * percentile(durations, 95),
+                    1000 * max(durations),
+                    sum(e['queries'] for e in entries[view]) / n,
+                    sum(e['bytes'] for e in entries[view]) / n))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from j60adm.models import Association, Person
+
+
+class Command(BaseCommand):
+    help = ('Recompute the cached person fields computed for another '
+            'period than the current one, such as after changing '
+            'J60ADM_ASSOCIATION in the settings.')
+
+    def handle(self, *args, **options):
+        current_period = Association.get().current_period
+        with transaction.atomic():
+            n = Person.update_stale_cached_fields(current_period)
+        self.stdout.write('%s persons updated' % n)
@@ -0,0 +1,198 @@
+import re
+import math
+import heapq
+import collections
+
+from j60adm.models import Person, Title, EmailAddress
+
+
+# Weights of the name, title and email similarity in a candidate's score
+NAME_WEIGHT = 1.0
+TITLE_WEIGHT = 0.5
+EMAIL_WEIGHT = 1.0
+
+# Candidates scoring below this are not suggested
+MIN_SCORE = 0.5
+
+EPSILON = 1e-9
+
+Candidate = collections.namedtuple('Candidate', 'person_id label score')
+
+word_pattern = re.compile(r'\w+')
+
+
+def words(s):
+    """
+    >>> words('Jens-Ole  Ærø (FUAN)')
+    ['jens', 'ole', 'ærø', 'fuan']
+    """
+    return word_pattern.findall(s.lower())
+
+
+def trigrams(s):
+    """
+    Set of trigrams of the words of s, each word padded with two spaces
+    in front and one behind as in PostgreSQL's pg_trgm.
+
+    >>> sorted(trigrams('Bo'))
+    ['  b', ' bo', 'bo ']
+    """
+    grams = set()
+    for w in words(s):
+        w = '  %s ' % w
+        grams.update(w[i:i + 3] for i in range(len(w) - 2))
+    return grams
+
+
+def title_keys(title, period):
+    """
+    Strings a person holding the given title might write for it.
+
+    >>> title_keys('FUAN', 2012)
+    ['FUAN', 'FUAN12', 'AN']
+    """
+    keys = [title, '%s%s' % (title, str(period)[2:])]
+    if title.startswith('FU'):
+        keys.append(title[2:])
+    return keys
+
+
+class PersonIndex:
+    """
+    Trigram index over the names, titles and email addresses of persons,
+    used to propose persons for registrations and survey responses.
+
+    Each field of each person is stored as a set of trigrams, and an
+    inverted index maps every trigram to the persons having it, so a
+    lookup only visits persons sharing one of the query's least
+    frequent trigrams.
+    """
+
+    def __init__(self):
+        self.labels = {}
+        self.name_grams = {}
+        self.title_grams = collections.defaultdict(set)
+        self.name_postings = collections.defaultdict(list)
+        self.title_postings = collections.defaultdict(list)
+        self.emails = collections.defaultdict(set)
+
+    @classmethod
+    def build(cls):
+        """
+        Index all persons using three queries.
+        """
+        index = cls()
+        titles = collections.defaultdict(list)
+        qs = Title.objects.all()
+        for person_id, title, period in qs.values_list(
+                'person_id', 'title', 'period'):
+            titles[person_id].append(Title(period=period, title=title))
+        qs = Person.objects.order_by('title_order', 'name')
+        for person_id, name in qs.values_list('pk', 'name'):
+            index.add_person(person_id, name, titles[person_id])
+        qs = EmailAddress.objects.all()
+        for person_id, address in qs.values_list('person_id', 'address'):
+            index.emails[EmailAddress.normalize(address)].add(person_id)
+        return index
+
+    def add_person(self, person_id, name, titles):
+        self.labels[person_id] = ' '.join(
+            [str(t) for t in titles] + [name])
+        grams = trigrams(name)
+        self.name_grams[person_id] = grams
+        for g in grams:
+            self.name_postings[g].append(person_id)
+        grams = self.title_grams[person_id]
+        for t in titles:
+            for key in [str(t)] + title_keys(t.title, t.period):
+                grams.update(trigrams(key))
+        for g in grams:
+            self.title_postings[g].append(person_id)
+
+    def candidates(self, postings, query, min_overlap):
+        """
+        Persons sharing at least min_overlap of the trigrams in query
+        with the field indexed by postings, and possibly some sharing
+        fewer. Such a person must have one of the
+        len(query) - min_overlap + 1 least frequent trigrams of query,
+        so only the postings of those are visited.
+        """
+        grams = sorted(query, key=lambda g: len(postings.get(g, ())))
+        result = set()
+        for g in grams[:len(query) - max(min_overlap, 1) + 1]:
+            result.update(postings.get(g, ()))
+        return result
+
+    def match(self, name='', title='', email='', limit=3,
+              min_score=MIN_SCORE):
+        """
+        Return up to limit Candidates for the given name, title and email,
+        best first.
+
+        The score is the weighted mean of the trigram similarity of the
+        name (Dice coefficient) and the title (fraction of the title's
+        trigrams found among the person's titles). A person having the
+        given email address gets EMAIL_WEIGHT added to both the sum
+        and the total weight, so the email only ever counts in favour.
+        """
+        name_query = trigrams(name)
+        title_query = trigrams(title)
+        name_weight = NAME_WEIGHT if name_query else 0
+        title_weight = TITLE_WEIGHT if title_query else 0
+        total = name_weight + title_weight
+        email_ids = self.emails.get(EmailAddress.normalize(email), ())
+        if not total and not email_ids:
+            return []
+
+        # Only visit the persons that can reach min_score, using the
+        # smallest name or title similarity needed when the other field
+        # is a perfect match.
+        candidates = set(email_ids)
+        need = min_score * total
+        if name_weight:
+            t = max(need - title_weight, 0) / name_weight
+            min_overlap = math.ceil(
+                t * len(name_query) / (2 - t) - EPSILON)
+            candidates.update(self.candidates(
+                self.name_postings, name_query, min_overlap))
+        if title_weight and need - name_weight > 0:
+            t = (need - name_weight) / title_weight
+            min_overlap = math.ceil(t * len(title_query) - EPSILON)
+            candidates.update(self.candidates(
+                self.title_postings, title_query, min_overlap))
+
+        scores = []
+        for person_id in candidates:
+            score = 0
+            if name_weight:
+                n = len(name_query & self.name_grams[person_id])
+                score += name_weight * 2 * n / (
+                    len(name_query) + len(self.name_grams[person_id]))
+            if title_weight:
+                n = len(title_query & self.title_grams[person_id])
+                score += title_weight * n / len(title_query)
+            if person_id in email_ids:
+                score = (score + EMAIL_WEIGHT) / (total + EMAIL_WEIGHT)
+            else:
+                score = score / total
+            if score >= min_score:
+                scores.append((-score, person_id))
+        return [Candidate(person_id, self.labels[person_id], -score)
+                for score, person_id in heapq.nsmallest(limit, scores)]
+
+
+def suggest_persons(rows, index=None, **kwargs):
+    """
+    Propose persons for the given registrations or survey responses.
+    Return {row pk: [Candidate, ...]} for the rows with a candidate.
+    """
+    if index is None:
+        index = PersonIndex.build()
+    suggestions = {}
+    for row in rows:
+        candidates = index.match(
+            name=row.name, title=getattr(row, 'title', ''),
+            email=row.email, **kwargs)
+        if candidates:
+            suggestions[row.pk] = candidates
+    return suggestions
@@ -1,7 +1,101 @@
+import time
+import logging
+
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.http import JsonResponse
+from django.shortcuts import render
 from ipware.ip import get_real_ip
 
+from j60adm.models import Association
+from j60adm.instrumentation import QueryCounter
+from j60adm.profiling import profile_view
+
+
+request_logger = logging.getLogger('j60adm.requests')
+
+# Requests taking at least this many seconds are logged as warnings
+SLOW_REQUEST = 1.0
+
 
 class Middleware(object):
+    """
+    Attach log_data to each request, and log the duration, SQL queries
+    and response size of each view to the j60adm.requests logger.
+
+    Queries are counted by a QueryCounter installed on the default
+    connection during the request. For streaming responses the entry is
+    logged when the content has been sent, so the queries and time spent
+    producing it are included.
+    """
+
     def process_request(self, request):
+        Association.check_version()
         request.log_data = dict(
             ip=get_real_ip(request), user=request.user)
+        request.instrumentation = dict(
+            start=time.perf_counter(), view=None, queries=QueryCounter())
+        request.instrumentation['queries'].install(
+            connections[DEFAULT_DB_ALIAS])
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.instrumentation['view'] = getattr(
+            view_func, '__name__', None)
+
+    def process_response(self, request, response):
+        instrumentation = getattr(request, 'instrumentation', None)
+        if instrumentation is None:
+            return response
+        entry = dict(
+            method=request.method, path=request.path,
+            view=instrumentation['view'], status=response.status_code)
+        if response.streaming:
+            response.streaming_content = self.count_bytes(
+                request, response.streaming_content, entry)
+        else:
+            entry['bytes'] = len(response.content)
+            self.log(request, entry)
+        return response
+
+    def count_bytes(self, request, content, entry):
+        entry['bytes'] = 0
+        try:
+            for chunk in content:
+                entry['bytes'] += len(chunk)
+                yield chunk
+        finally:
+            self.log(request, entry)
+
+    def log(self, request, entry):
+        instrumentation = request.instrumentation
+        QueryCounter.uninstall(connections[DEFAULT_DB_ALIAS])
+        queries = instrumentation['queries']
+        duration = time.perf_counter() - instrumentation['start']
+        entry.update(
+            duration=round(duration, 4),
+            queries=queries.count,
+            sql_time=round(queries.time, 4))
+        entry.update(request.log_data)
+        request_logger.log(
+            logging.WARNING if duration >= SLOW_REQUEST else logging.INFO,
+            "%s %s %s %.3f s %s queries", entry['method'], entry['path'],
+            entry['status'], duration, entry['queries'], extra=entry)
+
+
+class ProfileMiddleware(object):
+    """
+    For staff users, run the view under the profiler when the request
+    has the profile query parameter or an X-Profile header, and return
+    the report instead of the page: HTML, or JSON with profile=json.
+    The functions are sorted by sort=tottime (default) or sort=cumtime.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mode = request.GET.get('profile',
+                               request.META.get('HTTP_X_PROFILE'))
+        if mode is None or not request.user.is_staff:
+            return None
+        report = profile_view(view_func, request, view_args, view_kwargs,
+                              sort=request.GET.get('sort', 'tottime'))
+        if mode == 'json':
+            return JsonResponse(report)
+        return render(request, 'j60adm/profile.html', dict(report=report))
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 08:42
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_title_order(apps, schema_editor):
+    # Same encoding as Person.title_order_string
+    Person = apps.get_model('j60adm', 'Person')
+    qs = Person.objects.all().prefetch_related('title_set')
+    for p in qs:
+        titles = p.title_set.all()
+        if titles:
+            t = min(titles, key=lambda t: (-t.period, t.title))
+            title_order = '1%04d%d%d%s' % (
+                9999 - t.period, t.title.startswith('EFU'),
+                t.title.startswith('FU'), t.title)
+        else:
+            title_order = '2%s' % (p.name,)
+        Person.objects.filter(pk=p.pk).update(title_order=title_order)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('j60adm', '0010_title_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='title_order',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=250),
+        ),
+        migrations.RunPython(fill_title_order, migrations.RunPython.noop),
+    ]
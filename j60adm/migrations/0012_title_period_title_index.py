@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 08:47
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('j60adm', '0011_person_title_order'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='title',
+            index_together=set([('period', 'title')]),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 08:50
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def merge_duplicate_addresses(apps, schema_editor):
+    # Normalize addresses and merge duplicates per person,
+    # moving their messages to the address that is kept.
+    EmailAddress = apps.get_model('j60adm', 'EmailAddress')
+    EmailMessage = apps.get_model('j60adm', 'EmailMessage')
+    keep = {}
+    for e in EmailAddress.objects.order_by('pk'):
+        address = e.address.lower().strip()
+        k = (e.person_id, address)
+        if k not in keep:
+            keep[k] = e
+            if e.address != address:
+                e.address = address
+                e.save()
+        else:
+            EmailMessage.objects.filter(recipient=e).update(
+                recipient=keep[k])
+            e.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('j60adm', '0012_title_period_title_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddressSynchronization',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.DateTimeField()),
+                ('full', models.BooleanField()),
+                ('created', models.IntegerField()),
+            ],
+            options={
+                'ordering': ['time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='registration',
+            name='updated_time',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='surveyresponse',
+            name='updated_time',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(merge_duplicate_addresses,
+                             migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='emailaddress',
+            unique_together=set([('person', 'address')]),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 08:58
+from __future__ import unicode_literals
+import json
+import collections
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def sup(n):
+    # Same as Title.sup
+    digits = '⁰¹²³⁴⁵⁶⁷⁸⁹'
+    return ''.join(digits[int(i)] for i in str(n))
+
+
+def tk_prefix(age):
+    # Same as Title.tk_prefix
+    prefix = ['', 'G', 'B', 'O', 'TO']
+    if age < 0:
+        return 'K%s' % sup(-age)
+    elif age < len(prefix):
+        return prefix[age]
+    else:
+        return 'T%sO' % sup(age - 3)
+
+
+def write_cached_fields(Person, current_period, **extra):
+    # Same values as Person.compute_cached_fields, computed with the
+    # historical Person model. Also used by 0019_person_cached_period.
+    qs = Person.objects.all().prefetch_related('title_set')
+    for p in qs:
+        titles = sorted(p.title_set.all(), key=lambda t: (-t.period, t.title))
+        name = '\u271D%s' % (p.name,) if p.dead else p.name
+        dumps = []
+        for t in titles:
+            age = current_period - t.period
+            dumps.append(collections.OrderedDict([
+                ('id', t.id),
+                ('age', age),
+                ('prefix', tk_prefix(age)),
+                ('title', t.title),
+                ('period', t.period),
+            ]))
+        display_name = ' '.join(
+            ['%s%s' % (d['prefix'], d['title']) for d in dumps] + [name])
+        dump = collections.OrderedDict([
+            ('id', p.pk),
+            ('str', display_name),
+            ('name', p.name),
+            ('titles', dumps),
+            ('street', p.street),
+            ('city', p.city),
+            ('country', p.country),
+            ('dead', p.dead),
+        ])
+        Person.objects.filter(pk=p.pk).update(
+            display_name=display_name, dump_json=json.dumps(dump), **extra)
+
+
+def fill_cached_fields(apps, schema_editor):
+    # AssociationConfig does not exist yet, so the current period
+    # comes from the settings.
+    association = getattr(settings, 'J60ADM_ASSOCIATION', {})
+    current_period = association.get('current_period', 2015)
+    write_cached_fields(apps.get_model('j60adm', 'Person'), current_period)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('j60adm', '0013_address_synchronization'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='display_name',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='dump_json',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(fill_cached_fields, migrations.RunPython.noop),
+    ]
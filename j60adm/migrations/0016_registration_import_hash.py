@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 09:07
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_survey_ids(apps, schema_editor):
+    Registration = apps.get_model('j60adm', 'Registration')
+    qs = Registration.objects.values('survey_id')
+    qs = qs.annotate(n=Count('pk')).filter(n__gt=1)
+    duplicates = sorted(r['survey_id'] for r in qs)
+    if duplicates:
+        raise ValueError(
+            'Registrations with the same survey_id must be merged ' +
+            'before migrating: %s' % ', '.join(duplicates))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('j60adm', '0015_association_config'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_survey_ids,
+                             migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='registration',
+            name='import_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AlterField(
+            model_name='registration',
+            name='survey_id',
+            field=models.CharField(max_length=200, unique=True),
+        ),
+    ]
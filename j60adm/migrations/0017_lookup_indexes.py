@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 09:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('j60adm', '0016_registration_import_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='addresssynchronization',
+            name='time',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='emailaddress',
+            name='address',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='dead',
+            field=models.BooleanField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='letter_bounced',
+            field=models.BooleanField(db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='emailmessage',
+            index_together=set([('recipient', 'bounce')]),
+        ),
+    ]
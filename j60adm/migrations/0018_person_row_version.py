@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 09:32
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import j60adm.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('j60adm', '0017_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='row_version',
+            field=models.CharField(default=j60adm.models.new_row_version, editable=False, max_length=32),
+        ),
+    ]
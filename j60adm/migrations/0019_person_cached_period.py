@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 09:45
+from __future__ import unicode_literals
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_cached_period(apps, schema_editor):
+    # Recompute the fields for the current period, which may have been
+    # changed in AssociationConfig since 0014 computed them.
+    config = apps.get_model('j60adm', 'AssociationConfig')
+    config = config.objects.order_by('pk').first()
+    if config is None:
+        association = getattr(settings, 'J60ADM_ASSOCIATION', {})
+        current_period = association.get('current_period', 2015)
+    else:
+        current_period = config.current_period
+    m = import_module('j60adm.migrations.0014_person_cached_fields')
+    m.write_cached_fields(apps.get_model('j60adm', 'Person'), current_period,
+                          cached_period=current_period)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('j60adm', '0018_person_row_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='cached_period',
+            field=models.IntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_cached_period, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 11:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_search_name(apps, schema_editor):
+    Person = apps.get_model('j60adm', 'Person')
+    for pk, name in Person.objects.values_list('pk', 'name'):
+        Person.objects.filter(pk=pk).update(search_name=name.lower())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('j60adm', '0019_person_cached_period'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='search_name',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 10:01
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('j60adm', '0020_person_search_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='addresssynchronization',
+            name='updated_time_mark',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
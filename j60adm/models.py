@@ -1,40 +1,159 @@
 # vim: set fileencoding=utf8:
 from __future__ import unicode_literals
-import re
+import json
+import uuid
+import hashlib
 import collections
-from django.db import models
-from django.utils.encoding import python_2_unicode_compatible
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import models, connection, transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils.encoding import python_2_unicode_compatible
+
+
+def new_row_version():
+    return uuid.uuid4().hex
 
 
 @python_2_unicode_compatible
 class Association:
-    def __init__(self, *, name, current_period):
+    """
+    The association and its current period, from the AssociationConfig
+    row or else settings.J60ADM_ASSOCIATION.
+
+    Association.get() loads it once per process. Saving AssociationConfig
+    calls invalidate(), and the middleware calls check_version() on each
+    request to notice changes made by other processes. Loading it has no
+    side effects: saving AssociationConfig brings the cached person fields
+    up to date, and after changing the period in the settings, run
+    "manage.py update_cached_fields".
+    """
+
+    VERSION_KEY = 'j60adm:association:version'
+
+    # Periods before current_period in prefix_by_period
+    PREFIX_TABLE_AGES = range(-10, 100)
+
+    _current = None
+
+    def __init__(self, *, name, current_period, version=None):
         self.name = name
         self.current_period = current_period
+        self.version = version
+        self.prefix_by_period = {
+            current_period - age: Title.tk_prefix(age)
+            for age in self.PREFIX_TABLE_AGES}
 
     @classmethod
     def get(cls):
-        return cls(name='TÅGEKAMMERET', current_period=2015)
+        association = cls._current
+        if association is None:
+            association = cls._current = cls.load()
+        return association
+
+    @classmethod
+    def load(cls):
+        version = cache.get(cls.VERSION_KEY)
+        config = AssociationConfig.objects.order_by('pk').first()
+        if config is None:
+            kwargs = dict(getattr(settings, 'J60ADM_ASSOCIATION', {}))
+            kwargs.setdefault('name', 'TÅGEKAMMERET')
+            kwargs.setdefault('current_period', 2015)
+        else:
+            kwargs = dict(name=config.name,
+                          current_period=config.current_period)
+        return cls(version=version, **kwargs)
+
+    @classmethod
+    def invalidate(cls):
+        cls._current = None
+
+    @classmethod
+    def check_version(cls):
+        association = cls._current
+        if (association is not None and
+                association.version != cache.get(cls.VERSION_KEY)):
+            cls.invalidate()
+
+    def prefix(self, period):
+        """
+        >>> Association(name='TK', current_period=2015).prefix(1972)
+        'T⁴⁰O'
+        """
+        try:
+            return self.prefix_by_period[period]
+        except KeyError:
+            return Title.tk_prefix(self.current_period - period)
 
     def __str__(self):
         return self.name
 
 
+class AssociationConfig(models.Model):
+    """
+    Overrides settings.J60ADM_ASSOCIATION when present,
+    so the current period can be changed without a deploy.
+    There is at most one.
+    """
+    name = models.CharField(max_length=200)
+    current_period = models.IntegerField()
+
+    def __str__(self):
+        return '%s %s' % (self.name, self.current_period)
+
+    def save(self, *args, **kwargs):
+        # Run association_changed() in the transaction changing the period
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            super().delete(*args, **kwargs)
+
+    def clean(self):
+        qs = AssociationConfig.objects.exclude(pk=self.pk)
+        if qs.exists():
+            raise ValidationError(
+                'Der kan kun være én forening. Ret den eksisterende.')
+
+
 @python_2_unicode_compatible
 class Person(models.Model):
     name = models.CharField(max_length=200)
     street = models.CharField(max_length=200, blank=True)
     city = models.CharField(max_length=200, blank=True)
     country = models.CharField(max_length=200, blank=True)
-    dead = models.BooleanField(blank=True)
+    dead = models.BooleanField(blank=True, db_index=True)
 
-    letter_bounced = models.BooleanField(blank=True)
+    letter_bounced = models.BooleanField(blank=True, db_index=True)
 
     created_time = models.DateTimeField(auto_now_add=True)
 
     note = models.TextField(blank=True)
 
+    # Materialized title_order_key(), title_and_name() and dump(),
+    # kept up to date by save() and update_cached_fields().
+    title_order = models.CharField(max_length=250, blank=True,
+                                   editable=False, db_index=True)
+    display_name = models.TextField(blank=True, editable=False)
+    dump_json = models.TextField(blank=True, editable=False)
+    # The name lowercased in Python, since the database may fold case
+    # only for ASCII (SQLite does), which misses names such as Æbelø.
+    search_name = models.TextField(blank=True, editable=False)
+    # Association.current_period the fields above were computed for
+    cached_period = models.IntegerField(null=True, editable=False,
+                                        db_index=True)
+
+    cached_fields = ('title_order', 'display_name', 'dump_json',
+                     'search_name', 'cached_period')
+
+    # Replaced whenever the person or anything shown with the person in
+    # the person list changes, so cached rows can be keyed on it.
+    row_version = models.CharField(max_length=32, default=new_row_version,
+                                   editable=False)
+
     def __str__(self):
         if self.dead:
             return '\u271D%s' % (self.name,)
@@ -59,24 +178,164 @@ class Person(models.Model):
             # Order persons without a title after persons with a title.
             return (2, self.name)
 
+    @staticmethod
+    def title_order_string(titles, name):
+        """
+        Encode title_order_key() as a string that sorts the same way,
+        so the database can order persons by it.
+
+        >>> Person.title_order_string([], 'Anders')
+        '2Anders'
+        >>> Person.title_order_string(
+        ...     [Title(period=2010, title='KASS'),
+        ...      Title(period=2012, title='FUAN'),
+        ...      Title(period=2012, title='CERM')], 'Anders')
+        '1798700CERM'
+        >>> Person.title_order_string([Title(period=2012, title='EFUIT')], '')
+        '1798710EFUIT'
+        """
+        try:
+            # The first title of the latest period in title_set order
+            t = min(titles, key=lambda t: (-t.period, t.title))
+        except ValueError:
+            return '2%s' % (name,)
+        return '1%04d%d%d%s' % (
+            9999 - t.period, t.title.startswith('EFU'),
+            t.title.startswith('FU'), t.title)
+
+    def get_titles(self):
+        return self.title_set.all() if self.pk else []
+
+    @staticmethod
+    def compute_cached_fields(person, titles):
+        """
+        Values of the materialized fields of person holding the given
+        titles. person may be any object with the fields of Person,
+        such as a historical model in a migration.
+        """
+        titles = sorted(titles, key=lambda t: (-t.period, t.title))
+        str_ = Person.__str__(person)
+        display_name = ' '.join([str(t) for t in titles] + [str_])
+        dump = collections.OrderedDict([
+            ('id', person.pk),
+            ('str', display_name),
+            ('name', person.name),
+            ('titles', [t.dump() for t in titles]),
+            ('street', person.street),
+            ('city', person.city),
+            ('country', person.country),
+            ('dead', person.dead),
+        ])
+        return dict(
+            title_order=Person.title_order_string(titles, person.name),
+            display_name=display_name,
+            dump_json=json.dumps(dump),
+            search_name=person.name.lower(),
+            cached_period=Association.get().current_period)
+
+    @classmethod
+    def write_cached_fields(cls, values):
+        """
+        Store {person id: compute_cached_fields()} with a single
+        executemany() UPDATE statement.
+        """
+        if not values:
+            return
+        qn = connection.ops.quote_name
+        sql = 'UPDATE %s SET %s WHERE %s = %%s' % (
+            qn(cls._meta.db_table),
+            ', '.join('%s = %%s' % qn(cls._meta.get_field(f).column)
+                      for f in cls.cached_fields),
+            qn(cls._meta.pk.column))
+        params = [[v[f] for f in cls.cached_fields] + [pk]
+                  for pk, v in values.items()]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    @classmethod
+    def update_cached_fields(cls, person_ids=None, chunk_size=500):
+        """
+        Recompute the materialized fields of the given persons,
+        or of all persons, and store the ones that changed.
+        """
+        if person_ids is None:
+            person_ids = cls.objects.values_list('pk', flat=True)
+        person_ids = sorted(person_ids)
+        changed = {}
+        for i in range(0, len(person_ids), chunk_size):
+            qs = cls.objects.filter(pk__in=person_ids[i:i + chunk_size])
+            qs = qs.prefetch_related('title_set')
+            for person in qs:
+                values = cls.compute_cached_fields(
+                    person, person.title_set.all())
+                if any(getattr(person, k) != v for k, v in values.items()):
+                    changed[person.pk] = values
+        cls.write_cached_fields(changed)
+        return len(changed)
+
+    @classmethod
+    def update_stale_cached_fields(cls, current_period):
+        """
+        Recompute the materialized fields of the persons whose fields
+        were computed for another period than current_period.
+        Return the number of persons.
+        """
+        from j60adm.picker import invalidate_person_picker
+
+        qs = cls.objects.exclude(cached_period=current_period)
+        person_ids = list(qs.values_list('pk', flat=True))
+        if person_ids:
+            cls.update_cached_fields(person_ids)
+            cls.bump_row_versions(person_ids)
+            invalidate_person_picker()
+        return len(person_ids)
+
+    @classmethod
+    def bump_row_versions(cls, person_ids=None, chunk_size=500):
+        """
+        Give the given persons, or all persons, a new row_version.
+        """
+        version = new_row_version()
+        if person_ids is None:
+            cls.objects.update(row_version=version)
+            return
+        person_ids = sorted(set(person_ids) - {None})
+        for i in range(0, len(person_ids), chunk_size):
+            cls.objects.filter(pk__in=person_ids[i:i + chunk_size]).update(
+                row_version=version)
+
+    def set_cached_fields(self):
+        values = self.compute_cached_fields(self, self.get_titles())
+        for k, v in values.items():
+            setattr(self, k, v)
+
+    def save(self, *args, **kwargs):
+        created = self.pk is None
+        self.set_cached_fields()
+        self.row_version = new_row_version()
+        super().save(*args, **kwargs)
+        if created:
+            # dump_json contains the id, which is only known now
+            self.set_cached_fields()
+            type(self).objects.filter(pk=self.pk).update(
+                dump_json=self.dump_json)
+
     def title_and_name(self):
-        p = [str(t) for t in self.title_set.all()]
-        return ' '.join(p + [str(self)])
+        if not self.display_name:
+            return self.compute_cached_fields(
+                self, self.get_titles())['display_name']
+        return self.display_name
 
     def dump(self):
         """
         Information for client code in a dictionary.
         """
-        return collections.OrderedDict([
-            ('id', self.id),
-            ('str', self.title_and_name()),
-            ('name', self.name),
-            ('titles', [t.dump() for t in self.title_set.all()]),
-            ('street', self.street),
-            ('city', self.city),
-            ('country', self.country),
-            ('dead', self.dead),
-        ])
+        dump_json = self.dump_json
+        if not dump_json:
+            dump_json = self.compute_cached_fields(
+                self, self.get_titles())['dump_json']
+        return json.loads(
+            dump_json, object_pairs_hook=collections.OrderedDict)
 
 
 @python_2_unicode_compatible
@@ -114,24 +373,9 @@ class Title(models.Model):
         >>> Title.parse('OOFULD').title
         'OFULD'
         """
-        i = 0
-        age = 0
-        prefixes = dict(zip('KGBOT', [-1, 1, 2, 3, 1]))
-        p = '^(%s|%s)(%s)$' % (cls.canonical_prefix_pattern,
-                               cls.prefix_pattern, cls.title_pattern)
-        mo = re.match(p, s)
-        if mo is None:
-            raise ValidationError("Couldn't parse %r" % (s,))
-        prefix_part = mo.group(1)
-        title = mo.group(2)
-        for mo in re.finditer(cls.prefix_term_pattern, prefix_part):
-            p = mo.group(0)
-            if len(p) == 1:
-                age += prefixes[p]
-            else:
-                age += prefixes[p[0]] * int(p[1:])
-
-        period = Association.get().current_period - age
+        from j60adm.titles import parse_title
+
+        period, title = parse_title(s)
         return cls(period=period, title=title)
 
     @staticmethod
@@ -153,7 +397,7 @@ class Title(models.Model):
 
     @property
     def prefix(self):
-        return self.tk_prefix(self.age)
+        return self.association.prefix(self.period)
 
     def __str__(self):
         return '%s%s' % (self.prefix, self.title)
@@ -162,19 +406,20 @@ class Title(models.Model):
         return collections.OrderedDict([
             ('id', self.id),
             ('age', self.age),
-            ('prefix', self.tk_prefix(self.age)),
+            ('prefix', self.prefix),
             ('title', self.title),
             ('period', self.period),
         ])
 
     class Meta:
         ordering = ['-period', 'title']
+        index_together = [('period', 'title')]
 
 
 @python_2_unicode_compatible
 class EmailAddress(models.Model):
     person = models.ForeignKey(Person, on_delete=models.CASCADE)
-    address = models.CharField(max_length=200)
+    address = models.CharField(max_length=200, db_index=True)
     source = models.CharField(max_length=200)
 
     def __str__(self):
@@ -182,6 +427,11 @@ class EmailAddress(models.Model):
 
     class Meta:
         ordering = ['address']
+        unique_together = [('person', 'address')]
+
+    @staticmethod
+    def normalize(address):
+        return address.lower().strip()
 
 
 class EmailMessage(models.Model):
@@ -191,6 +441,7 @@ class EmailMessage(models.Model):
 
     class Meta:
         ordering = ['recipient']
+        index_together = [('recipient', 'bounce')]
 
 
 @python_2_unicode_compatible
@@ -204,6 +455,8 @@ class SurveyResponse(models.Model):
     newsletter = models.BooleanField(blank=True)
     note = models.CharField(max_length=200, blank=True)
 
+    updated_time = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
         return '<SurveyResponse name=%s>' % (self.name,)
 
@@ -225,7 +478,7 @@ class Registration(models.Model):
     person = models.ForeignKey(Person, on_delete=models.SET_NULL,
                                null=True, blank=True)
     time = models.DateTimeField()
-    survey_id = models.CharField(max_length=200)
+    survey_id = models.CharField(max_length=200, unique=True)
     first_name = models.CharField(max_length=200)
     last_name = models.CharField(max_length=200)
     email = models.CharField(max_length=200)
@@ -238,6 +491,25 @@ class Registration(models.Model):
 
     note = models.CharField(max_length=200, blank=True)
 
+    updated_time = models.DateTimeField(auto_now=True, db_index=True)
+
+    # import_hash_fields as of the latest import of this registration
+    import_hash = models.CharField(max_length=40, blank=True,
+                                   editable=False)
+
+    import_hash_fields = (
+        'survey_id', 'time', 'first_name', 'last_name', 'email', 'dietary',
+        'newsletter', 'transportation', 'webshop_show', 'note')
+
+    def compute_import_hash(self):
+        """
+        Hash of the fields set by parse_registrations(), so an unchanged
+        registration can be recognized when the export is imported again.
+        """
+        values = [getattr(self, f) for f in self.import_hash_fields]
+        data = json.dumps(values, default=str).encode('utf8')
+        return hashlib.sha1(data).hexdigest()
+
     @property
     def name(self):
         return '%s %s' % (self.first_name, self.last_name)
@@ -257,3 +529,84 @@ class Registration(models.Model):
 
     class Meta:
         ordering = ['time']
+
+
+class AddressSynchronization(models.Model):
+    """
+    A run of j60adm.addresses.synchronize_addresses(). The next
+    incremental run picks up the rows updated at or after the
+    updated_time_mark of the latest run.
+    """
+    time = models.DateTimeField(db_index=True)
+    full = models.BooleanField(blank=True)
+    created = models.IntegerField()
+    # The latest updated_time of the registrations and survey responses
+    # seen by this or an earlier run
+    updated_time_mark = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['time']
+
+
+@receiver(pre_save, sender=Title)
+@receiver(pre_save, sender=EmailAddress)
+@receiver(pre_save, sender=SurveyResponse)
+@receiver(pre_save, sender=Registration)
+def remember_previous_person(sender, instance, raw, **kwargs):
+    # Remember the previous person in case the object is moved
+    if instance.pk and not raw:
+        qs = sender.objects.filter(pk=instance.pk)
+        instance._previous_person_id = (
+            qs.values_list('person_id', flat=True).first())
+
+
+@receiver(post_save, sender=Title)
+@receiver(post_delete, sender=Title)
+def title_changed(sender, instance, **kwargs):
+    from j60adm.picker import invalidate_person_picker
+
+    person_ids = {instance.person_id,
+                  getattr(instance, '_previous_person_id', None)}
+    Person.update_cached_fields(person_ids - {None})
+    Person.bump_row_versions(person_ids)
+    invalidate_person_picker()
+
+
+@receiver(post_save, sender=EmailAddress)
+@receiver(post_delete, sender=EmailAddress)
+@receiver(post_save, sender=SurveyResponse)
+@receiver(post_delete, sender=SurveyResponse)
+@receiver(post_save, sender=Registration)
+@receiver(post_delete, sender=Registration)
+def person_row_changed(sender, instance, **kwargs):
+    # These are shown with the person in the person list
+    Person.bump_row_versions(
+        {instance.person_id, getattr(instance, '_previous_person_id', None)})
+
+
+@receiver(post_save, sender=EmailMessage)
+@receiver(post_delete, sender=EmailMessage)
+def email_message_changed(sender, instance, **kwargs):
+    qs = EmailAddress.objects.filter(pk=instance.recipient_id)
+    Person.bump_row_versions(qs.values_list('person_id', flat=True))
+
+
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+def person_changed(sender, instance, **kwargs):
+    from j60adm.picker import invalidate_person_picker
+
+    invalidate_person_picker()
+
+
+@receiver(post_save, sender=AssociationConfig)
+@receiver(post_delete, sender=AssociationConfig)
+def association_changed(sender, instance, **kwargs):
+    from j60adm.picker import invalidate_person_picker
+
+    Association.invalidate()
+    with transaction.atomic():
+        Person.update_stale_cached_fields(Association.get().current_period)
+    invalidate_person_picker()
+    transaction.on_commit(
+        lambda: cache.set(Association.VERSION_KEY, uuid.uuid4().hex, None))
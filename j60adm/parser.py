@@ -1,23 +1,56 @@
 # vim: set fileencoding=utf8:
 from __future__ import unicode_literals
-import re
+import io
 import csv
-import datetime
+import collections
 from django.core.exceptions import ValidationError
-from django.utils import timezone
+
+from j60adm.timestamps import SURVEY_TIME, REGISTRATION_TIME
+
+
+ADDRESSES_EMAILS_HEADER = [
+    'Navn', 'Titel (nyeste)', 'Grad', 'Email', 'Gade', 'By', 'Land',
+    'Afdød', 'Modtager', 'Bounce?']
 
 
 def parse_addresses_emails(csv_text):
+    persons = []
+    objects = []
+    email_messages = []
+    for p, o, m in iter_addresses_emails(csv_text.splitlines(True)):
+        persons.extend(p)
+        objects.extend(o)
+        email_messages.extend(m)
+    return persons, objects, email_messages
+
+
+def iter_addresses_emails(lines, batch_size=500):
+    """
+    Parse the address list from an iterable of lines, e.g. an open file,
+    and yield (persons, objects, messages) for at most batch_size persons
+    at a time, so the input is never held in memory all at once.
+
+    >>> lines = ['\\t'.join(ADDRESSES_EMAILS_HEADER) + '\\n',
+    ...          'Anders\\tKASS\\t0\\ta@x.dk\\t\\t\\t\\t\\t\\t\\n',
+    ...          'Bent\\tBFORM\\t2\\t\\t\\t\\t\\t\\t\\t\\n',
+    ...          'Carl\\tKASS\\tx\\t\\t\\t\\t\\t\\t\\t\\n']
+    >>> batches = iter_addresses_emails(lines, batch_size=1)
+    >>> [len(x) for x in next(batches)]
+    [1, 2, 1]
+    >>> [len(x) for x in next(batches)]
+    [1, 1, 0]
+    >>> next(batches)
+    Traceback (most recent call last):
+    ...
+    django.core.exceptions.ValidationError: ["Line 4: Invalid age: 'x'"]
+    """
     from j60adm.models import (
         Association, Person, Title, EmailAddress, EmailMessage)
 
     association = Association.get()
-    reader = csv.reader(csv_text.splitlines(True), dialect='excel-tab')
-    rows = iter(reader)
-    header = next(rows)
-    expected_header = [
-        'Navn', 'Titel (nyeste)', 'Grad', 'Email', 'Gade', 'By', 'Land',
-        'Afdød', 'Modtager', 'Bounce?']
+    reader = csv.reader(lines, dialect='excel-tab')
+    header = next(reader, [])
+    expected_header = ADDRESSES_EMAILS_HEADER
     if header[:len(expected_header)] != expected_header:
         raise ValidationError(
             "Header does not match expectation: %r is not a prefix of %r" %
@@ -26,29 +59,46 @@ def parse_addresses_emails(csv_text):
     titles = []
     email_addresses = []
     email_messages = []
-    for row in rows:
+    for row in reader:
+        if len(row) < 10:
+            raise ValidationError("Line %s: Expected at least 10 cells: %r" %
+                                  (reader.line_num, row))
         (name, title, age, email, street, city, country,
          dead, _recipient, bounce) = row[:10]
 
-        expected_prefix = Title.tk_prefix(int(age), sup_fn=str)
+        try:
+            age = int(age)
+        except ValueError:
+            raise ValidationError("Line %s: Invalid age: %r" %
+                                  (reader.line_num, age))
+        expected_prefix = Title.tk_prefix(age, sup_fn=str)
         if not title.startswith(expected_prefix):
-            raise ValidationError("Expected %r to start with %r (age %r)" %
-                                  (title, expected_prefix, int(age)))
+            raise ValidationError(
+                "Line %s: Expected %r to start with %r (age %r)" %
+                (reader.line_num, title, expected_prefix, age))
         title = title[len(expected_prefix):]
 
         dead = (dead == 'ja')
         bounce = bool(bounce)
-        period = association.current_period - int(age)
+        period = association.current_period - age
         person = Person(
-            name=name, street=street, city=city, country=country, dead=dead)
+            name=name, street=street, city=city, country=country, dead=dead,
+            letter_bounced=False)
         persons.append(person)
         titles.append(Title(person=person, title=title, period=period))
         if email:
             email_addresses.append(EmailAddress(
                 person=person, address=email.lower().strip(), source='j60adr'))
             email_messages.append(EmailMessage(
-                address=email_addresses[-1], bounce=bounce))
-    return persons, titles + email_addresses, email_messages
+                recipient=email_addresses[-1], bounce=bounce))
+        if len(persons) >= batch_size:
+            yield persons, titles + email_addresses, email_messages
+            persons = []
+            titles = []
+            email_addresses = []
+            email_messages = []
+    if persons:
+        yield persons, titles + email_addresses, email_messages
 
 
 def parse_survey_responses(csv_text):
@@ -63,19 +113,14 @@ def parse_survey_responses(csv_text):
         raise ValidationError(
             "Header does not match expectation: %r is not a prefix of %r" %
             (expected_header, header))
-    survey_responses = []
+    rows = [row for row in rows if any(row)]
     for row in rows:
-        if not any(row):
-            continue
         if len(row) < 6:
             raise ValidationError("Expected at least 6 cells: %r" % (row,))
-        time, name, title, email, newsletter, note = row[:6]
-        mo = re.match(r'(\d+)/(\d+)/(\d+) (\d+):(\d+):(\d+)', time)
-        month, day, year, hour, minute, second = mo.groups()
-        tzinfo = timezone.get_default_timezone()
-        time = datetime.datetime(int(year), int(month), int(day),
-                                 int(hour), int(minute), int(second),
-                                 tzinfo=tzinfo)
+    times = SURVEY_TIME.parse_column(row[0] for row in rows)
+    survey_responses = []
+    for time, row in zip(times, rows):
+        _, name, title, email, newsletter, note = row[:6]
         newsletter = newsletter.startswith('Ja')
         survey_responses.append(SurveyResponse(
             time=time, name=name, title=title, email=email,
@@ -83,6 +128,39 @@ def parse_survey_responses(csv_text):
     return survey_responses
 
 
+def _section_rows(reader, end):
+    row = next(reader, None)
+    while row == []:
+        row = next(reader, None)
+    while row:
+        yield row
+        row = next(reader, None)
+    while row == []:
+        row = next(reader, None)
+    end.append(row)
+
+
+def iter_webshop_sections(lines):
+    """
+    Read the ;-separated webshop export from an iterable of lines in a
+    single pass. Yield (title, rows) for each section, where rows is an
+    iterator over the section's rows, its header first. Each section's
+    rows must be consumed before advancing to the next section;
+    unconsumed rows are skipped.
+    """
+    reader = csv.reader(lines, delimiter=';')
+    row = next(reader, None)
+    while row is not None:
+        if len(row) != 3 or row != ['Arrangement:', row[1], '']:
+            raise ValidationError("Unexpected row %r" % (row,))
+        end = []
+        rows = _section_rows(reader, end)
+        yield row[1], rows
+        for _ in rows:
+            pass
+        row, = end
+
+
 def extract_registration_sections(csv_text):
     """
     >>> extract_registration_sections('''\\
@@ -96,95 +174,100 @@ def extract_registration_sections(csv_text):
     ... ''')
     [('Bla', [['A', 'B'], ['C', 'D']]), ('Hej', [['E', 'F', 'G']])]
     """
-    sections = []
+    lines = io.StringIO(csv_text, newline='')
+    return [(title, list(rows))
+            for title, rows in iter_webshop_sections(lines)]
 
-    reader = csv.reader(csv_text.splitlines(True), delimiter=';')
-    rows = iter(reader)
-    row = next(rows)
 
-    while row is not None:
-        if len(row) != 3 or row != ['Arrangement:', row[1], '']:
-            raise ValidationError("Unexpected row %r" % (row,))
-        section_title = row[1]
-        row = next(rows)
-        while row == []:
-            row = next(rows, None)
-        section_rows = []
-        while row:
-            section_rows.append(row)
-            row = next(rows, None)
-        while row == []:
-            row = next(rows, None)
-        sections.append((section_title, section_rows))
-    return sections
-
-
-def get_registration_people(sections):
-    shows = {
-        'Jeg kan desværre ikke komme til revyen': 'none',
-        'Revyforestillingen kl. 13.30': 'first',
-        'Revyforestillingen kl. 16.00': 'second',
-    }
-
-    if len(sections) != 1 + len(shows):
-        raise ValidationError("Expected %s sections, found %s" %
-                              (1 + len(shows), len(sections)))
-    name = sections[0][0]
-    expected = 'TÅGEKAMMERETS 60 års jubilæumsfest'
-    if name != expected:
-        raise ValidationError("Expected %r, got %r" % (expected, name))
-
-    header = ['ID', 'Fornavn', 'Efternavn', 'Adresse', 'Postnr/by',
-              'Email', 'Ansættelsessted', 'Stilling', 'Tilmeldingsdato',
-              'Antal', 'Stykpris', '', 'Rabat', 'Betalt', 'Markedsføring',
-              'Note']
-    first_row = sections[0][1][0]
-    if first_row != header:
-        raise ValidationError("Expected %r, got %r" % (header, first_row))
-
-    by_id = {}
-    for row in sections[0][1][1:]:
-        id = row[0]
-        by_id[id] = (row, {})
-
-    for name, rows in sections[1:]:
+WEBSHOP_EVENT = 'TÅGEKAMMERETS 60 års jubilæumsfest'
+
+WEBSHOP_SHOWS = {
+    'Jeg kan desværre ikke komme til revyen': 'none',
+    'Revyforestillingen kl. 13.30': 'first',
+    'Revyforestillingen kl. 16.00': 'second',
+}
+
+WEBSHOP_HEADER = [
+    'ID', 'Fornavn', 'Efternavn', 'Adresse', 'Postnr/by',
+    'Email', 'Ansættelsessted', 'Stilling', 'Tilmeldingsdato',
+    'Antal', 'Stykpris', '', 'Rabat', 'Betalt', 'Markedsføring',
+    'Note']
+
+# The show sections have WEBSHOP_HEADER[:-1] followed by the questions
+# about dietary needs, transportation and the newsletter, and 'Note'.
+WEBSHOP_SHOW_HEADER = WEBSHOP_HEADER[:-1]
+
+RegistrationRow = collections.namedtuple(
+    'RegistrationRow',
+    'survey_id first_name last_name email time note refund_note')
+
+ShowRow = collections.namedtuple(
+    'ShowRow', 'show dietary transportation newsletter')
+
+
+def read_registration_rows(lines):
+    """
+    Read the webshop export in one pass into an OrderedDict of
+    {ID: (RegistrationRow, [ShowRow, ...])}, keeping only the columns
+    used by make_registration(). Column positions are resolved from
+    each section's header once.
+    """
+    sections = iter_webshop_sections(lines)
+    found = 0
+    seen = set()
+    people = collections.OrderedDict()
+    for title, rows in sections:
+        found += 1
+        header = next(rows, [])
+        if found == 1:
+            if title != WEBSHOP_EVENT:
+                raise ValidationError("Expected %r, got %r" %
+                                      (WEBSHOP_EVENT, title))
+            if header != WEBSHOP_HEADER:
+                raise ValidationError("Expected %r, got %r" %
+                                      (WEBSHOP_HEADER, header))
+            # The refund note is in an extra column without a header
+            columns = [header.index(k) for k in (
+                'ID', 'Fornavn', 'Efternavn', 'Email', 'Tilmeldingsdato',
+                'Note')] + [len(header)]
+            for row in rows:
+                if len(row) != len(header) + 1:
+                    raise ValidationError(
+                        "Expected %s columns, got %s: %s" %
+                        (len(header) + 1, len(row), row))
+                people[row[0]] = (
+                    RegistrationRow._make([row[i] for i in columns]), [])
+            continue
         try:
-            key = shows.pop(name)
+            show = WEBSHOP_SHOWS[title]
         except KeyError:
             raise ValidationError("Unexpected %r, expected one of %r" %
-                                  (key, sorted(shows.keys())))
-        header = ['ID', 'Fornavn', 'Efternavn', 'Adresse', 'Postnr/by',
-                  'Email', 'Ansættelsessted', 'Stilling', 'Tilmeldingsdato',
-                  'Antal', 'Stykpris', '', 'Rabat', 'Betalt', 'Markedsføring',
-                  # 'Er du vegetar, allergiker, eller lignende? ' +
-                  # 'Hvis ja, anfør det her:',
-                  # 'Er du gangbesværet, og har du ikke selv mulighed ' +
-                  # 'for at transportere\ndig mellem Matematisk Institut ' +
-                  # 'og Stakladen (ca. 650 m)?\nHvis ja, så anfør det her, ' +
-                  # 'og så forsøger vi at arrangere transport:',
-                  # '5. Ønsker du at modtage vores J60-nyhedsbrev og få ' +
-                  # 'informationer om salg\naf merchandise, arrangementer i ' +
-                  # 'jubilæumsugen, og lignende (maks. 1\nemail om måneden)?',
-                  # 'Note',
-                  ]
-        first_row = rows[0]
-        if first_row[:len(header)] != header:
+                                  (title, sorted(WEBSHOP_SHOWS.keys())))
+        if title in seen:
+            raise ValidationError("Duplicate section %r" % (title,))
+        seen.add(title)
+        n = len(WEBSHOP_SHOW_HEADER)
+        if header[:n] != WEBSHOP_SHOW_HEADER:
             raise ValidationError("Expected %r, got %r" %
-                                  (header, first_row[:len(header)]))
-        if len(first_row) != len(header) + 4:
+                                  (WEBSHOP_SHOW_HEADER, header[:n]))
+        if len(header) != n + 4:
             raise ValidationError("Expected %s columns, got %s" %
-                                  (len(header) + 4, len(first_row)))
-        if first_row[-1] != 'Note':
-            raise ValidationError("Expected 'Note', got %s" % (first_row[-1],))
-        for row in rows[1:]:
-            id = row[0]
+                                  (n + 4, len(header)))
+        if header[-1] != 'Note':
+            raise ValidationError("Expected 'Note', got %s" % (header[-1],))
+        for row in rows:
             try:
-                p = by_id[id]
+                shows = people[row[0]][1]
             except KeyError:
-                raise ValidationError("ID %r not in main list" % (id,))
-            p[1][key] = row
-
-    return by_id
+                raise ValidationError("ID %r not in main list" % (row[0],))
+            shows.append(ShowRow(show, row[n], row[n + 1] == 'Ja',
+                                 row[n + 2] == 'Ja'))
+    if found == 0:
+        raise ValidationError("Expected %r, found nothing" % (WEBSHOP_EVENT,))
+    missing = sorted(set(WEBSHOP_SHOWS.keys()) - seen)
+    if missing:
+        raise ValidationError("Missing sections %r" % (missing,))
+    return people
 
 
 def parse_registration_time_naive(time):
@@ -196,50 +279,46 @@ def parse_registration_time_naive(time):
     ...
     django.core.exceptions.ValidationError: ['Invalid time: bla']
     """
-    try:
-        return datetime.datetime.strptime(time, '%d-%m-%Y %H:%M:%S')
-    except ValueError:
-        raise ValidationError("Invalid time: %s" % (time,))
+    return REGISTRATION_TIME.parse_naive(time)
 
 
 def parse_registration_time(time):
-    dt = parse_registration_time_naive(time)
-    return dt.replace(tzinfo=timezone.get_default_timezone())
+    return REGISTRATION_TIME.parse(time)
 
 
-def make_registration(data):
+def make_registration(row, shows, time):
     from j60adm.models import Registration
 
-    main_row, shows_rows = data
-    if len(main_row) != 17:
-        raise ValidationError("Expected 17 columns, got %s: %s" %
-                              (len(main_row), main_row))
-    (id, first_name, last_name, _1, _2, email, _3, _4, time,
-     _5, _6, _7, _8, _9, _10, note, refund_note) = main_row[:17]
-    if len(shows_rows) == 0:
+    if len(shows) == 0:
         dietary = ''
         newsletter = False
         transportation = False
-        if refund_note.startswith('Krediteret'):
+        if row.refund_note.startswith('Krediteret'):
             show = 'refund'
         else:
-            raise ValidationError("No shows and no refund: %r" %
-                                  (main_row[:16],))
-    elif len(shows_rows) == 1:
-        (show, show_row), = shows_rows.items()
-        dietary, transportation, newsletter = show_row[15:18]
-        transportation = (transportation == 'Ja')
-        newsletter = (newsletter == 'Ja')
-    time = parse_registration_time(time)
+            raise ValidationError("No shows and no refund: %r" % (row,))
+    elif len(shows) == 1:
+        show, dietary, transportation, newsletter = shows[0]
+    else:
+        raise ValidationError("More than one show: %r" % (row,))
     return Registration(
-        time=time, survey_id=id, first_name=first_name, last_name=last_name,
-        email=email, dietary=dietary, newsletter=newsletter,
-        transportation=transportation, show=show, webshop_show=show,
-        note=note + refund_note)
+        time=time, survey_id=row.survey_id, first_name=row.first_name,
+        last_name=row.last_name, email=row.email, dietary=dietary,
+        newsletter=newsletter, transportation=transportation,
+        show=show, webshop_show=show, note=row.note + row.refund_note)
+
+
+def read_registrations(lines):
+    """
+    Parse the webshop export from an iterable of lines
+    into a list of unsaved Registrations.
+    """
+    people = read_registration_rows(lines)
+    times = REGISTRATION_TIME.parse_column(
+        row.time for row, shows in people.values())
+    return [make_registration(row, shows, time)
+            for (row, shows), time in zip(people.values(), times)]
 
 
 def parse_registrations(csv_text):
-    sections = extract_registration_sections(csv_text)
-    people = get_registration_people(sections)
-    registrations = [make_registration(d) for d in people.values()]
-    return registrations
+    return read_registrations(io.StringIO(csv_text, newline=''))
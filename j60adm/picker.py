@@ -0,0 +1,48 @@
+import json
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from j60adm.models import Person
+
+
+VERSION_KEY = 'j60adm:person_picker:version'
+DATA_KEY = 'j60adm:person_picker:data:%s'
+TIMEOUT = 24 * 60 * 60
+
+
+def get_person_picker_version():
+    """
+    Opaque token identifying the current person picker dataset.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_person_picker():
+    """
+    Start a new dataset version once the current transaction commits,
+    so no request can cache uncommitted data under the new version.
+    """
+    transaction.on_commit(
+        lambda: cache.set(VERSION_KEY, uuid.uuid4().hex, None))
+
+
+def get_person_picker_data():
+    """
+    Return (version, JSON text) of Person.dump() for all persons,
+    cached per version.
+    """
+    version = get_person_picker_version()
+    data = cache.get(DATA_KEY % version)
+    if data is None:
+        qs = Person.objects.all()
+        data = '[%s]' % ', '.join(
+            p.dump_json or json.dumps(p.dump()) for p in qs)
+        cache.set(DATA_KEY % version, data, TIMEOUT)
+    return version, data
@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import pstats
+import contextlib
+import cProfile
+import functools
+import collections
+
+from django.db import connection
+from django.db.backends.utils import CursorDebugWrapper
+from django.template.base import Template
+
+import j60adm
+
+
+# Number of functions shown in a profiling report
+TOP_FUNCTIONS = 30
+
+# pstats columns a report can be sorted by
+SORT_COLUMNS = {'tottime': 2, 'cumtime': 3}
+
+PACKAGE_PARENT = os.path.dirname(
+    os.path.dirname(os.path.abspath(j60adm.__file__)))
+
+# Frames of the profiling machinery are left out of query stacks
+IGNORED_MODULES = ('j60adm/profiling.py', 'j60adm/middleware.py')
+
+TEMPLATE_RENDER = Template.render.__code__
+TEMPLATE_RENDER_KEY = (TEMPLATE_RENDER.co_filename,
+                       TEMPLATE_RENDER.co_firstlineno,
+                       TEMPLATE_RENDER.co_name)
+
+
+@functools.lru_cache(maxsize=None)
+def project_path(filename):
+    """
+    Path of filename relative to the project if it is in j60adm,
+    and None otherwise.
+    """
+    path = os.path.relpath(os.path.abspath(filename), PACKAGE_PARENT)
+    if path.startswith('j60adm' + os.sep) and path not in IGNORED_MODULES:
+        return path
+
+
+def short_path(filename):
+    """
+    >>> short_path('/usr/lib/python3/site-packages/django/db/utils.py')
+    'django/db/utils.py'
+    """
+    path = project_path(filename)
+    if path is not None:
+        return path
+    parts = filename.rsplit('-packages' + os.sep, 1)
+    return parts[-1]
+
+
+def stack_summary():
+    """
+    The frames of the current stack in j60adm and the templates being
+    rendered, outermost first.
+    """
+    summary = []
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if code is TEMPLATE_RENDER:
+            summary.append('template %s' % (frame.f_locals['self'].name,))
+        else:
+            path = project_path(code.co_filename)
+            if path is not None:
+                summary.append('%s:%s %s' % (
+                    path, frame.f_lineno, code.co_name))
+        frame = frame.f_back
+    summary.reverse()
+    return summary
+
+
+class ProfilingCursor(CursorDebugWrapper):
+    """
+    Debug cursor that also records each statement with its duration
+    and the stack it was executed from.
+    """
+
+    def __init__(self, cursor, db, queries):
+        super().__init__(cursor, db)
+        self.queries = queries
+
+    def execute(self, sql, params=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            self.record(sql, params, time.perf_counter() - start)
+
+    def executemany(self, sql, param_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, param_list)
+        finally:
+            self.record(sql, None, time.perf_counter() - start)
+
+    def record(self, sql, params, duration):
+        self.queries.append(dict(
+            sql=self.db.ops.last_executed_query(self.cursor, sql, params),
+            template=sql, time=duration, stack=stack_summary()))
+
+
+@contextlib.contextmanager
+def recording_queries():
+    """
+    Record the statements executed on the default connection within the
+    block, as dicts with the keys sql, template, time and stack, in the
+    list returned by the context manager.
+    """
+    queries = []
+    force_debug_cursor = connection.force_debug_cursor
+    connection.force_debug_cursor = True
+    connection.make_debug_cursor = functools.partial(
+        ProfilingCursor, db=connection, queries=queries)
+    try:
+        yield queries
+    finally:
+        del connection.make_debug_cursor
+        connection.force_debug_cursor = force_debug_cursor
+
+
+def similar_queries(queries):
+    """
+    Groups of the queries sharing their SQL up to the parameters, such
+    as the queries of an N+1 pattern, most frequent first.
+    """
+    groups = collections.OrderedDict()
+    for q in queries:
+        groups.setdefault(q['template'], []).append(q)
+    result = []
+    for group in groups.values():
+        if len(group) > 1:
+            result.append(dict(
+                sql=group[0]['sql'], count=len(group),
+                distinct=len(set(q['sql'] for q in group)),
+                time=sum(q['time'] for q in group),
+                stack=group[0]['stack']))
+    result.sort(key=lambda g: g['count'], reverse=True)
+    return result
+
+
+def top_functions(profiler, sort='tottime'):
+    stats = pstats.Stats(profiler).stats
+    column = SORT_COLUMNS.get(sort, SORT_COLUMNS['tottime'])
+    items = sorted(stats.items(), key=lambda item: item[1][column],
+                   reverse=True)
+    return [
+        dict(function='%s:%s(%s)' % (short_path(filename), line, name),
+             calls=nc, tottime=tt, cumtime=ct)
+        for (filename, line, name), (cc, nc, tt, ct, callers)
+        in items[:TOP_FUNCTIONS]]
+
+
+def template_time(profiler):
+    """
+    Time spent rendering templates, counting nested templates once.
+    """
+    stats = pstats.Stats(profiler).stats
+    try:
+        return stats[TEMPLATE_RENDER_KEY][3]
+    except KeyError:
+        return 0
+
+
+def profile_view(view_func, request, args, kwargs, sort='tottime'):
+    """
+    Call the view, render its response and read its content under
+    cProfile while recording every SQL statement. Return a report of
+    the time spent, the slowest functions and the queries.
+    """
+    profiler = cProfile.Profile()
+    with recording_queries() as queries:
+        start = time.perf_counter()
+        response = profiler.runcall(view_func, request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response = profiler.runcall(response.render)
+        if response.streaming:
+            content = profiler.runcall(list, response.streaming_content)
+            size = sum(map(len, content))
+        else:
+            size = len(response.content)
+        duration = time.perf_counter() - start
+    return dict(
+        path=request.get_full_path(),
+        view=getattr(view_func, '__name__', None),
+        status=response.status_code,
+        bytes=size,
+        time=duration,
+        sql_time=sum(q['time'] for q in queries),
+        template_time=template_time(profiler),
+        functions=top_functions(profiler, sort),
+        similar_queries=similar_queries(queries),
+        queries=[dict(sql=q['sql'], time=q['time'], stack=q['stack'])
+                 for q in queries])
@@ -0,0 +1,43 @@
+from django.core.cache import caches
+from django.db.models.query import prefetch_related_objects
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+
+ROW_KEY = 'j60adm:person_row:%s:%s'
+
+# Cached rows contain this instead of the CSRF token of the user
+# who happened to render them.
+CSRF_PLACEHOLDER = 'J60ADM-CSRF-TOKEN'
+
+
+def get_row_cache():
+    return caches['person_rows']
+
+
+def row_key(person):
+    return ROW_KEY % (person.pk, person.row_version)
+
+
+def render_person_rows(persons, template_name, lookups, csrf_token):
+    """
+    Render template_name for each person, reusing the rows cached under
+    the person's row_version. Only the persons whose row is missing get
+    lookups prefetched and their row rendered.
+    Return the HTML of the rows and the number of rows rendered.
+    """
+    persons = list(persons)
+    cache = get_row_cache()
+    rows = cache.get_many([row_key(p) for p in persons])
+    dirty = [p for p in persons if row_key(p) not in rows]
+    if dirty:
+        prefetch_related_objects(dirty, lookups)
+        template = get_template(template_name)
+        rendered = {
+            row_key(p): template.render(
+                dict(person=p, csrf_token=CSRF_PLACEHOLDER))
+            for p in dirty}
+        cache.set_many(rendered)
+        rows.update(rendered)
+    html = ''.join(rows[row_key(p)] for p in persons)
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, csrf_token)), len(dirty)
@@ -0,0 +1,58 @@
+import re
+
+from django.db.models import Q
+
+from j60adm.models import Association, Person
+
+
+TITLE_FILTER = '#CERM#EFUIT#FORM#INKA#KASS#NF#PR#SEKR'
+PREFIX_AGES = {'G*': None, '': 0, 'G': 1, 'B': 2, 'O': 3, 'TO': 4}
+
+period_pattern = re.compile(r'^(?:19|20)\d\d$')
+prefix_pattern = re.compile(r'^(G\*|G|B|O|TO|T\d+O|(?=[CEFIKNPS]))(.*)$',
+                            re.I)
+
+
+def parse_search_term(v):
+    """
+    Server-side version of parse_search_term() from the person list:
+    a Q object selecting the persons matching the search term v.
+    Querysets filtered by it may contain duplicates; use distinct().
+    """
+    v = v.strip()
+    if not v:
+        return Q()
+    if period_pattern.match(v):
+        return Q(title__period=int(v))
+    mo = prefix_pattern.match(v)
+    if mo is not None:
+        prefix = mo.group(1).upper()
+        root = mo.group(2).upper()
+        if (prefix or ('#' + root) in TITLE_FILTER or
+                root in ('FU', 'FUAN')):
+            if len(prefix) <= 2:
+                age = PREFIX_AGES[prefix]
+            else:
+                age = 3 + int(prefix[1:-1])
+            q = Q(title__title__startswith=root)
+            if age is not None:
+                period = Association.get().current_period - age
+                q &= Q(title__period=period)
+            return q
+    # The client searches the name and the FU titles.
+    # search_name is lowercased in Python, as icontains folds case
+    # only for ASCII on SQLite.
+    return (Q(search_name__contains=v.lower()) |
+            Q(title__title__startswith='FU', title__title__icontains=v))
+
+
+def search_persons(search):
+    """
+    The persons matching the search term of the person list,
+    in the order of the list.
+    """
+    qs = Person.objects.all()
+    search = search.strip()
+    if search:
+        qs = qs.filter(parse_search_term(search)).distinct()
+    return qs.order_by('title_order', 'name')
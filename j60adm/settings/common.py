@@ -50,6 +50,7 @@ MIDDLEWARE_CLASSES = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'j60adm.middleware.Middleware',
+    'j60adm.middleware.ProfileMiddleware',
 ]
 
 ROOT_URLCONF = 'j60adm.urls'
@@ -84,6 +85,34 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/1.9/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
+    # Rendered rows of the person list (see j60adm.rowcache), kept in
+    # each process since there are many small entries and the keys
+    # change with the data.
+    'person_rows': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+
+# The association and its current period. Can be overridden without
+# a deploy by adding an AssociationConfig in the admin.
+
+J60ADM_ASSOCIATION = {
+    'name': 'TÅGEKAMMERET',
+    'current_period': 2015,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
 
@@ -132,6 +161,9 @@ LOGGING = {
             'format': ('[%(asctime)s %(name)s %(levelname)s %(ip)s ' +
                        '%(user)s] %(message)s'),
         },
+        'json': {
+            '()': 'j60adm.instrumentation.JsonFormatter',
+        },
     },
     'filters': {
         'require_debug_false': {
@@ -148,6 +180,15 @@ LOGGING = {
             'filename': os.path.join(BASE_DIR, 'django.log'),
             'formatter': 'simple',
         },
+        'requests': {
+            'level': 'INFO',
+            # Shared by all processes, which rotate it under a lock
+            'class': 'j60adm.instrumentation.QueueRotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'requests.log'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'formatter': 'json',
+        },
         'console': {
             'level': 'INFO',
             'filters': ['require_debug_true'],
@@ -171,5 +212,10 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': True,
         },
+        'j60adm.requests': {
+            'handlers': ['requests'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
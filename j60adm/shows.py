@@ -0,0 +1,38 @@
+import collections
+
+from django.db.models import Count
+
+from j60adm.models import Registration
+
+
+# Seats per show, and seats in the first show kept out of the webshop
+SHOW_CAPACITY = 200
+RESERVED_SEATS = {'first': 15}
+
+ShowCount = collections.namedtuple(
+    'ShowCount', 'key label count webshop_count seats_left')
+
+
+def show_counts():
+    """
+    Number of registrations by show and by webshop_show, as a ShowCount
+    for each show choice, computed by a single grouped COUNT query.
+    seats_left is None for the choices that are not actual shows.
+    """
+    by_show = collections.Counter()
+    by_webshop_show = collections.Counter()
+    qs = Registration.objects.order_by()
+    qs = qs.values_list('show', 'webshop_show').annotate(n=Count('pk'))
+    for show, webshop_show, n in qs:
+        by_show[show] += n
+        by_webshop_show[webshop_show] += n
+    counts = []
+    for key, label in Registration._meta.get_field('show').choices:
+        if key in ('first', 'second'):
+            seats_left = (SHOW_CAPACITY - RESERVED_SEATS.get(key, 0) -
+                          by_show[key])
+        else:
+            seats_left = None
+        counts.append(ShowCount(key, label, by_show[key],
+                                by_webshop_show[key], seats_left))
+    return counts
@@ -1,12 +1,13 @@
-function get_persons() {
-    function get_person(o) {
-        return JSON.parse(o.getAttribute('data-person'));
-    }
+function load_persons(callback) {
     var personList = document.getElementById('person-list');
-    var personElements = personList.querySelectorAll('li[data-person]');
-    var persons = [].slice.call(personElements).map(get_person);
     personList.style.display = 'none';
-    return persons;
+    var xhr = new XMLHttpRequest();
+    xhr.open('GET', personList.getAttribute('data-src'));
+    xhr.responseType = 'json';
+    xhr.onload = function () {
+        if (xhr.status === 200) callback(xhr.response);
+    };
+    xhr.send();
 }
 
 function make_index(values) {
@@ -1,5 +1,8 @@
 function init_letter_bounce() {
-    var persons = get_persons();
+    load_persons(setup_letter_bounce);
+}
+
+function setup_letter_bounce(persons) {
     var indexOf = make_name_index(persons);
     console.log(indexOf('Mathias'));
 
@@ -0,0 +1,35 @@
+function init_log_follow() {
+    var output = document.getElementById('log');
+    var src = output.getAttribute('data-src');
+    var filter = output.getAttribute('data-filter');
+
+    function at_bottom() {
+        return (window.innerHeight + window.scrollY >=
+                document.body.scrollHeight - 2);
+    }
+
+    function poll(params) {
+        var xhr = new XMLHttpRequest();
+        xhr.open('GET', src + '?' + params + (filter ? '&' + filter : ''));
+        xhr.onload = function () {
+            if (xhr.status !== 200) {
+                setTimeout(function () { poll(params); }, 5000);
+                return;
+            }
+            var scroll = at_bottom();
+            if (xhr.responseText !== '')
+                output.appendChild(document.createTextNode(xhr.responseText));
+            if (scroll) window.scrollTo(0, document.body.scrollHeight);
+            var offset = xhr.getResponseHeader('X-Log-Offset');
+            poll('start=' + offset + '&follow=1');
+        };
+        xhr.onerror = function () {
+            setTimeout(function () { poll(params); }, 5000);
+        };
+        xhr.send();
+    }
+
+    poll('tail=' + output.getAttribute('data-tail'));
+}
+
+window.addEventListener('load', init_log_follow);
@@ -148,7 +148,10 @@ function setup_person_complete(persons, indexOf, outputElement) {
 }
 
 function init_person_complete() {
-    var persons = get_persons();
+    load_persons(setup_persons_complete);
+}
+
+function setup_persons_complete(persons) {
     var indexOf = make_person_index(persons);
     var toComplete = [].slice.call(document.querySelectorAll('*[data-person-complete]'));
     for (var i = 0; i < toComplete.length; ++i)
@@ -0,0 +1,234 @@
+import random
+import datetime
+import collections
+
+from django.db import transaction
+from django.utils import timezone
+
+from j60adm.models import (
+    Association, Person, Title, EmailAddress, EmailMessage,
+    SurveyResponse, Registration,
+)
+from j60adm.parser import (
+    ADDRESSES_EMAILS_HEADER, WEBSHOP_EVENT, WEBSHOP_SHOWS, WEBSHOP_HEADER,
+    WEBSHOP_SHOW_HEADER,
+)
+
+
+# Population sizes the benchmarks are meant to be run at
+SIZES = (1000, 10000, 100000)
+
+FIRST_NAMES = (
+    'Anders Anne Bent Birgitte Camilla Christian Ditte Emil Frederik ' +
+    'Ida Jakob Jens Julie Karen Kasper Lars Line Mads Maria Mathias ' +
+    'Mette Niels Ole Peter Rasmus Signe Søren Thomas Trine Ulla').split()
+LAST_NAMES = (
+    'Andersen Christensen Hansen Jensen Jørgensen Larsen Madsen Møller ' +
+    'Nielsen Olsen Pedersen Petersen Poulsen Rasmussen Sørensen ' +
+    'Thomsen').split()
+TITLES = (
+    'CERM FORM INKA KASS NF PR SEKR VC FUAN FUHE FUIT EFUIT BEST').split()
+DOMAINS = 'gmail.com hotmail.com post.au.dk yahoo.dk mail.dk'.split()
+CITIES = ['8000 Aarhus C', '8200 Aarhus N', '8210 Aarhus V',
+          '2100 København Ø']
+
+# Share of persons having each of these
+DEAD = 0.02
+LETTER_BOUNCED = 0.03
+EMAIL_ADDRESS = 0.75
+SECOND_EMAIL_ADDRESS = 0.15
+EMAIL_MESSAGE = 0.6
+EMAIL_BOUNCE = 0.05
+REGISTRATION = 0.1
+SURVEY_RESPONSE = 0.08
+
+Fake = collections.namedtuple('Fake', 'name email age title')
+
+
+def random_title_tokens(n, seed=0):
+    # Canonical prefixes and no bare FU, so the tokens can be
+    # concatenated into TitleImport lines without ambiguity.
+    rng = random.Random(seed)
+    return [Title.tk_prefix(rng.randrange(50), sup_fn=str) +
+            rng.choice(TITLES)
+            for _ in range(n)]
+
+
+def fakes(n, seed=0):
+    """
+    n random names with an email address and the age and title
+    of their newest title.
+    """
+    rng = random.Random(seed)
+    result = []
+    for i in range(n):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        email = '%s.%s%s@%s' % (first.lower(), last.lower(), i,
+                                rng.choice(DOMAINS))
+        result.append(Fake('%s %s' % (first, last), email,
+                           rng.randrange(50), rng.choice(TITLES)))
+    return result
+
+
+def random_time(rng, start=datetime.datetime(2016, 3, 1), days=90):
+    return start + datetime.timedelta(seconds=rng.randrange(days * 86400))
+
+
+def address_list(n, seed=0):
+    """
+    Text of an address list with n persons for parse_addresses_emails().
+    """
+    rng = random.Random(seed)
+    lines = ['\t'.join(ADDRESSES_EMAILS_HEADER)]
+    for f in fakes(n, seed):
+        has_email = rng.random() < EMAIL_ADDRESS
+        lines.append('\t'.join([
+            f.name, Title.tk_prefix(f.age, sup_fn=str) + f.title,
+            str(f.age), f.email if has_email else '',
+            'Gade %s' % rng.randrange(1, 100), rng.choice(CITIES),
+            '', 'ja' if rng.random() < DEAD else '', '',
+            'x' if has_email and rng.random() < EMAIL_BOUNCE else '']))
+    return '\n'.join(lines) + '\n'
+
+
+def survey_export(n, seed=0):
+    """
+    Text of a survey export with n responses for parse_survey_responses().
+    """
+    rng = random.Random(seed)
+    lines = ['\t'.join(['Timestamp', 'Navn', 'Titel og årgang', 'Email',
+                        'Vil du modtage vores nyhedsbrev?', 'Bemærkninger'])]
+    for f in fakes(n, seed):
+        t = random_time(rng)
+        lines.append('\t'.join([
+            '%d/%d/%d %d:%02d:%02d' % (t.month, t.day, t.year,
+                                       t.hour, t.minute, t.second),
+            f.name, '%s %s' % (f.title, 2016 - f.age), f.email,
+            rng.choice(['Ja tak', 'Nej tak']), '']))
+    return '\n'.join(lines) + '\n'
+
+
+def webshop_export(n, seed=0):
+    """
+    Text of a webshop export with n tickets for parse_registrations().
+    Every tenth ticket is refunded, the rest are spread over the shows.
+    """
+    rng = random.Random(seed)
+    lines = ['Arrangement:;%s;' % WEBSHOP_EVENT, '', ';'.join(WEBSHOP_HEADER)]
+    shows = collections.OrderedDict((title, []) for title in WEBSHOP_SHOWS)
+    for i, f in enumerate(fakes(n, seed)):
+        survey_id = str(100000 + i)
+        refund = i % 10 == 0
+        first_name, last_name = f.name.split(' ', 1)
+        lines.append(';'.join(
+            [survey_id, first_name, last_name, 'Gade 1', '8000 Aarhus C',
+             f.email, '', '',
+             random_time(rng).strftime('%d-%m-%Y %H:%M:%S'),
+             '1', '100', '', '', '', '', '',
+             'Krediteret %s' % survey_id if refund else '']))
+        if not refund:
+            shows[rng.choice(list(shows))].append(survey_id)
+    questions = ['"Er du vegetar?"', '"Er du gangbesværet?"',
+                 '"Nyhedsbrev?"', 'Note']
+    for title, survey_ids in shows.items():
+        lines += ['', 'Arrangement:;%s;' % title, '',
+                  ';'.join(WEBSHOP_SHOW_HEADER + questions)]
+        for survey_id in survey_ids:
+            lines.append(';'.join(
+                [survey_id] + [''] * (len(WEBSHOP_SHOW_HEADER) - 1) +
+                [rng.choice(['', '', 'vegetar']),
+                 rng.choice(['Nej', 'Nej', 'Ja']),
+                 rng.choice(['Ja', 'Nej']), '']))
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def title_lines(n, seed=0):
+    """
+    TitleImport text with four titles on each line.
+    """
+    tokens = random_title_tokens(n, seed)
+    return '\n'.join(''.join(tokens[i:i + 4])
+                     for i in range(0, len(tokens), 4))
+
+
+def generate_population(persons, seed=0):
+    """
+    Insert persons persons with titles, email addresses and messages,
+    registrations and survey responses in the proportions given above,
+    chosen by a random generator seeded with seed. Return the number
+    of rows created of each model.
+    """
+    from j60adm.importer import bulk_create_with_ids
+
+    rng = random.Random(seed)
+    current_period = Association.get().current_period
+    with transaction.atomic():
+        people = bulk_create_with_ids(Person, [
+            Person(name=f.name, street='Gade %s' % rng.randrange(1, 100),
+                   city=rng.choice(CITIES),
+                   dead=rng.random() < DEAD,
+                   letter_bounced=rng.random() < LETTER_BOUNCED)
+            for f in fakes(persons, seed)])
+        titles = collections.OrderedDict()
+        for p in people:
+            newest = current_period - rng.randrange(50)
+            titles[p] = [
+                Title(person=p, title=rng.choice(TITLES), period=newest - k)
+                for k in range(rng.choice([1, 1, 1, 2, 2, 3, 4]))]
+        bulk_create_with_ids(
+            Title, [t for person_titles in titles.values()
+                    for t in person_titles])
+        # The titles are at hand, so skip Person.update_cached_fields()
+        Person.write_cached_fields(collections.OrderedDict(
+            (p.pk, Person.compute_cached_fields(p, person_titles))
+            for p, person_titles in titles.items()))
+
+        addresses = []
+        for p in people:
+            if rng.random() < EMAIL_ADDRESS:
+                addresses.append(EmailAddress(
+                    person=p, address='p%s@%s' % (p.pk, rng.choice(DOMAINS)),
+                    source='j60adr'))
+                if rng.random() < SECOND_EMAIL_ADDRESS:
+                    addresses.append(EmailAddress(
+                        person=p, address='p%s.2@%s' % (p.pk, DOMAINS[0]),
+                        source='survey'))
+        bulk_create_with_ids(EmailAddress, addresses)
+        messages = [EmailMessage(recipient=a,
+                                 bounce=rng.random() < EMAIL_BOUNCE)
+                    for a in addresses if rng.random() < EMAIL_MESSAGE]
+        EmailMessage.objects.bulk_create(messages, batch_size=500)
+
+        registrations = []
+        survey_responses = []
+        for p in people:
+            first_name, last_name = p.name.split(' ', 1)
+            if rng.random() < REGISTRATION:
+                show = rng.choice(['first', 'second', 'none', 'refund'])
+                registrations.append(Registration(
+                    person=p if rng.random() < 0.8 else None,
+                    time=random_time(rng).replace(tzinfo=timezone.utc),
+                    survey_id='synthetic-%s' % p.pk,
+                    first_name=first_name, last_name=last_name,
+                    email='p%s@%s' % (p.pk, DOMAINS[0]),
+                    newsletter=rng.random() < 0.5,
+                    transportation=rng.random() < 0.1,
+                    show=show, webshop_show=show))
+            if rng.random() < SURVEY_RESPONSE:
+                survey_responses.append(SurveyResponse(
+                    person=p if rng.random() < 0.85 else None,
+                    time=random_time(rng).replace(tzinfo=timezone.utc),
+                    name=p.name, title=rng.choice(TITLES),
+                    email='p%s@%s' % (p.pk, DOMAINS[0]),
+                    newsletter=rng.random() < 0.5))
+        Registration.objects.bulk_create(registrations, batch_size=500)
+        SurveyResponse.objects.bulk_create(survey_responses, batch_size=500)
+    return collections.OrderedDict([
+        ('persons', len(people)),
+        ('titles', sum(map(len, titles.values()))),
+        ('email_addresses', len(addresses)),
+        ('email_messages', len(messages)),
+        ('registrations', len(registrations)),
+        ('survey_responses', len(survey_responses)),
+    ])
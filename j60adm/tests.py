@@ -0,0 +1,489 @@
+import os
+import datetime
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.test import TestCase, SimpleTestCase
+from django.utils import timezone
+
+from j60adm.addresses import (
+    synchronize_addresses, annotate_email_state, email_state_counts,
+    email_state, person_email_state,
+)
+from j60adm.importer import import_registrations, bulk_create_with_ids
+from j60adm.linking import (
+    parse_person_assignments, parse_person_form, reassign_persons,
+    PersonChange,
+)
+from j60adm.logfile import LogRange
+from j60adm.models import (
+    Association, AssociationConfig, Person, Title, EmailAddress,
+    EmailMessage, Registration, SurveyResponse, AddressSynchronization,
+)
+from j60adm.parser import parse_registrations, WEBSHOP_SHOWS
+from j60adm.search import parse_search_term
+from j60adm.synthetic import webshop_export
+
+
+class PersonMessageTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser('admin', '', 'admin')
+        self.client.force_login(user)
+        # Load the association outside the measured requests
+        Association.invalidate()
+        Association.get()
+
+    def create_person(self, name, email=None, bounce=False,
+                      registered=False):
+        person = Person.objects.create(name=name, dead=False,
+                                       letter_bounced=False)
+        if email is not None:
+            address = EmailAddress.objects.create(
+                person=person, address=email, source='test')
+            EmailMessage.objects.create(recipient=address, bounce=bounce)
+        if registered:
+            Registration.objects.create(
+                person=person, survey_id='survey-%s' % person.pk,
+                time=timezone.now(), first_name=name, last_name='',
+                email=email or '', newsletter=False,
+                transportation=False, show='first', webshop_show='first')
+        return person
+
+    def create_boards(self, periods, size):
+        """
+        A person with a title in each of the periods, each period with
+        a board of size other members. Return the person.
+        """
+        person = self.create_person('Formand', registered=True)
+        titles = 'FORM KASS SEKR CERM INKA NF PR VC'.split()
+        for period in periods:
+            Title.objects.create(person=person, title='FORM', period=period)
+            for i in range(1, size + 1):
+                member = self.create_person(
+                    'Medlem %s-%s' % (period, i),
+                    email='m%s-%s@example.com' % (period, i),
+                    bounce=i % 4 == 0, registered=i % 3 == 0)
+                Title.objects.create(person=member, period=period,
+                                     title=titles[i % len(titles)])
+        return person
+
+    def get(self, person):
+        return self.client.get(
+            reverse('person_message', kwargs=dict(pk=person.pk)))
+
+    def test_boards(self):
+        person = self.create_boards([2010], 4)
+        response = self.get(person)
+        board, = response.context['boards']
+        self.assertEqual(board['year'], '2010/11')
+        self.assertEqual([p['name'] for p in board['registered']],
+                         ['CERM Medlem 2010-3'])
+        self.assertEqual([p['name'] for p in board['not_registered']],
+                         ['KASS Medlem 2010-1', 'SEKR Medlem 2010-2'])
+        self.assertEqual([p['name'] for p in board['no_email']],
+                         ['INKA Medlem 2010-4'])
+
+    def test_number_of_queries(self):
+        # Session, user, person, titles, board members, their addresses
+        # and registrations, and the registrations of the person,
+        # however many titles and board members there are.
+        person = self.create_boards([2008, 2010, 2012, 2014, 2015], 8)
+        with self.assertNumQueries(8):
+            response = self.get(person)
+        self.assertEqual(len(response.context['boards']), 5)
+
+
+class ParseRegistrationsTest(TestCase):
+    def sections(self):
+        """
+        Return the webshop export split into {title: text} with the
+        main section under the key None.
+        """
+        main, *shows = webshop_export(20).split('Arrangement:;')[1:]
+        sections = {None: main}
+        sections.update((s.split(';', 1)[0], s) for s in shows)
+        return sections
+
+    def join(self, sections):
+        return ''.join('Arrangement:;' + s for s in sections)
+
+    def test_valid(self):
+        sections = self.sections()
+        registrations = parse_registrations(self.join(
+            [sections[None]] + [sections[t] for t in WEBSHOP_SHOWS]))
+        self.assertEqual(len(registrations), 20)
+
+    def test_duplicate_show(self):
+        sections = self.sections()
+        first, second, third = WEBSHOP_SHOWS
+        csv_text = self.join([sections[None], sections[first],
+                              sections[first], sections[third]])
+        with self.assertRaisesMessage(ValidationError, 'Duplicate'):
+            parse_registrations(csv_text)
+
+    def test_missing_show(self):
+        sections = self.sections()
+        first, second, third = WEBSHOP_SHOWS
+        csv_text = self.join([sections[None], sections[first],
+                              sections[second]])
+        with self.assertRaisesMessage(ValidationError, 'Missing'):
+            parse_registrations(csv_text)
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        Association.invalidate()
+        self.current_period = Association.get().current_period
+
+    def create_person(self, name, *titles):
+        person = Person.objects.create(name=name, dead=False,
+                                       letter_bounced=False)
+        for title, period in titles:
+            Title.objects.create(person=person, title=title, period=period)
+        return person
+
+    def search(self, term):
+        qs = Person.objects.filter(parse_search_term(term)).distinct()
+        return sorted(p.name for p in qs)
+
+    def test_non_ascii_name(self):
+        person = Person.objects.create(name='Anne Æbelø', dead=False,
+                                       letter_bounced=False)
+        for term in ('æbelø', 'ÆBELØ', 'anne æ'):
+            qs = Person.objects.filter(parse_search_term(term)).distinct()
+            self.assertEqual(list(qs), [person], term)
+
+    def test_titles(self):
+        p = self.current_period
+        self.create_person('Anders', ('KASS', p - 5), ('FORM', p - 4))
+        self.create_person('Bent', ('FUAN', p), ('FUHANDERS', p - 1))
+        self.create_person('Carl', ('KASS', p))
+        self.create_person('Dorte')
+        self.assertEqual(self.search(' %s ' % (p - 5,)), ['Anders'])
+        self.assertEqual(self.search('fuan'), ['Bent'])
+        self.assertEqual(self.search('G*kass'), ['Anders', 'Carl'])
+        self.assertEqual(self.search('T2Okass'), ['Anders'])
+        self.assertEqual(self.search('kass'), ['Carl'])
+        # The name and the FU titles
+        self.assertEqual(self.search('anders'), ['Anders', 'Bent'])
+        self.assertEqual(self.search('dort'), ['Dorte'])
+        self.assertEqual(self.search(''), ['Anders', 'Bent', 'Carl', 'Dorte'])
+
+
+class AssociationTest(TestCase):
+    def setUp(self):
+        Association.invalidate()
+
+    def tearDown(self):
+        Association.invalidate()
+
+    def test_get_does_not_write(self):
+        Person.objects.create(name='Anders', dead=False,
+                              letter_bounced=False)
+        Person.objects.update(cached_period=None)
+        Association.invalidate()
+        # Only reads the AssociationConfig row
+        with self.assertNumQueries(1):
+            Association.get()
+        self.assertEqual(
+            Person.objects.filter(cached_period=None).count(), 1)
+
+    def test_period_changed(self):
+        person = Person.objects.create(name='Anders', dead=False,
+                                       letter_bounced=False)
+        Title.objects.create(person=person, title='KASS', period=2010)
+        person.save()
+        row_version = person.row_version
+        AssociationConfig.objects.create(name='TK', current_period=2011)
+        person.refresh_from_db()
+        self.assertEqual(person.cached_period, 2011)
+        self.assertEqual(person.display_name, 'GKASS Anders')
+        self.assertNotEqual(person.row_version, row_version)
+
+
+class ImportRegistrationsTest(TestCase):
+    time = datetime.datetime(2016, 6, 3, 22, 38, 50, tzinfo=timezone.utc)
+
+    def registration(self, survey_id, show='first', note=''):
+        return Registration(
+            time=self.time, survey_id=survey_id, first_name='Anders',
+            last_name='And', email='anders@example.com', dietary='',
+            newsletter=False, transportation=True, show=show,
+            webshop_show=show, note=note)
+
+    def test_create(self):
+        report = import_registrations(
+            [self.registration('1'), self.registration('2', 'second')])
+        self.assertEqual(report, (2, 0, 0))
+        self.assertEqual(
+            list(Registration.objects.order_by('survey_id').values_list(
+                'survey_id', 'webshop_show')),
+            [('1', 'first'), ('2', 'second')])
+
+    def test_unchanged(self):
+        import_registrations([self.registration('1')])
+        before = Registration.objects.get()
+        report = import_registrations([self.registration('1')])
+        self.assertEqual(report, (0, 0, 1))
+        after = Registration.objects.get()
+        self.assertEqual(after.updated_time, before.updated_time)
+
+    def test_refund(self):
+        import_registrations([self.registration('1', note='a')])
+        before = Registration.objects.get()
+        report = import_registrations(
+            [self.registration('1', 'refund', note='Krediteret')])
+        self.assertEqual(report, (0, 1, 0))
+        after = Registration.objects.get()
+        self.assertEqual(after.webshop_show, 'refund')
+        self.assertEqual(after.show, 'first')
+        self.assertEqual(after.note, 'aKrediteret')
+        self.assertGreater(after.updated_time, before.updated_time)
+
+    def test_show_changed(self):
+        import_registrations([self.registration('1')])
+        before = Registration.objects.get()
+        with self.assertRaisesMessage(ValidationError,
+                                      'Show changed from first to second'):
+            import_registrations([self.registration('1', 'second'),
+                                  self.registration('2')])
+        self.assertEqual(list(Registration.objects.values_list(
+            'survey_id', 'webshop_show', 'import_hash')),
+            [('1', 'first', before.import_hash)])
+
+
+class SynchronizeAddressesTest(TestCase):
+    def create_registration(self, person, email):
+        return Registration.objects.create(
+            person=person, survey_id=email, time=timezone.now(),
+            first_name='', last_name='', email=email, newsletter=False,
+            transportation=False, show='first', webshop_show='first')
+
+    def addresses(self):
+        return set(EmailAddress.objects.values_list(
+            'person__name', 'address', 'source'))
+
+    def test_incremental_matches_full(self):
+        a = Person.objects.create(name='A', dead=False, letter_bounced=False)
+        b = Person.objects.create(name='B', dead=False, letter_bounced=False)
+        EmailAddress.objects.create(person=a, address='æbelø@example.com',
+                                    source='test')
+        self.create_registration(a, ' Æbelø@Example.com')
+        moved = self.create_registration(None, 'Moved@example.com')
+        SurveyResponse.objects.create(
+            person=b, time=timezone.now(), name='B', title='',
+            email='b@example.com', newsletter=False)
+        self.assertEqual(synchronize_addresses(), 1)
+
+        # Linked after the first run
+        self.create_registration(b, 'new@example.com')
+        row_version = Person.objects.get(pk=a.pk).row_version
+        reassign_persons(Registration, {moved.pk: a.pk})
+        self.assertEqual(synchronize_addresses(), 2)
+        self.assertNotEqual(Person.objects.get(pk=a.pk).row_version,
+                            row_version)
+        self.assertEqual(synchronize_addresses(), 0)
+        incremental = self.addresses()
+        self.assertEqual(incremental, {
+            ('A', 'æbelø@example.com', 'test'),
+            ('A', 'moved@example.com', 'Registration'),
+            ('B', 'b@example.com', 'Survey'),
+            ('B', 'new@example.com', 'Registration'),
+        })
+
+        EmailAddress.objects.exclude(source='test').delete()
+        self.assertEqual(synchronize_addresses(full=True), 3)
+        self.assertEqual(self.addresses(), incremental)
+        self.assertEqual(
+            list(AddressSynchronization.objects.values_list(
+                'full', 'created')),
+            [(True, 1), (False, 2), (False, 0), (True, 3)])
+
+
+class ReassignPersonsTest(TestCase):
+    def test_parse_person_assignments(self):
+        data = {'object_3': '7', 'object_4': '', 'object_x': '1',
+                'suggestion_5': '8', 'csrfmiddlewaretoken': 'z'}
+        self.assertEqual(parse_person_assignments(data), {3: 7})
+        self.assertEqual(parse_person_assignments(data, 'suggestion_'),
+                         {5: 8})
+
+    def test_typed_person_beats_suggestion(self):
+        self.assertEqual(
+            parse_person_form({'object_3': '7', 'suggestion_3': '8',
+                               'object_4': '', 'suggestion_4': '9'}),
+            {3: 7, 4: 9})
+
+    def test_reassign_persons(self):
+        a, b = [Person.objects.create(name=n, dead=False,
+                                      letter_bounced=False)
+                for n in 'AB']
+        responses = [
+            SurveyResponse.objects.create(
+                person=a, time=timezone.now(), name='', title='',
+                email='', newsletter=False)
+            for i in range(3)]
+        before = {r.pk: r.updated_time for r in responses}
+        versions = dict(Person.objects.values_list('pk', 'row_version'))
+        changes = reassign_persons(SurveyResponse, {
+            responses[0].pk: b.pk,  # Moved
+            responses[1].pk: a.pk,  # Unchanged
+            responses[2].pk: 0,  # No such person
+        })
+        self.assertEqual(changes,
+                         [PersonChange(responses[0].pk, a.pk, b.pk)])
+        after = {r.pk: r for r in SurveyResponse.objects.all()}
+        self.assertEqual([after[r.pk].person_id for r in responses],
+                         [b.pk, a.pk, a.pk])
+        self.assertGreater(after[responses[0].pk].updated_time,
+                           before[responses[0].pk])
+        self.assertEqual(after[responses[1].pk].updated_time,
+                         before[responses[1].pk])
+        for pk, version in Person.objects.values_list('pk', 'row_version'):
+            self.assertNotEqual(version, versions[pk])
+
+
+class SuggestionTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser('admin', '', 'admin')
+        self.client.force_login(user)
+
+    def create_registration(self, first_name, last_name):
+        return Registration.objects.create(
+            survey_id=first_name, time=timezone.now(),
+            first_name=first_name, last_name=last_name,
+            email='%s@example.com' % first_name.lower(), newsletter=False,
+            transportation=False, show='first', webshop_show='first')
+
+    def test_only_chosen_suggestions_are_saved(self):
+        anders = Person.objects.create(name='Anders And', dead=False,
+                                       letter_bounced=False)
+        bent = Person.objects.create(name='Bent Bille', dead=False,
+                                     letter_bounced=False)
+        chosen = self.create_registration('Anders', 'And')
+        unchosen = self.create_registration('Bent', 'Bille')
+        url = reverse('registration_person')
+
+        response = self.client.get(url, {'suggest': '1'})
+        self.assertEqual(response.context['suggested'], 2)
+        # Suggested, but "Ingen" is checked
+        self.assertContains(
+            response, '<input type="radio" name="suggestion_%s" value=""\n'
+            'checked="checked" />' % (unchosen.pk,))
+        self.assertContains(
+            response, '<input type="radio" name="suggestion_%s"\n'
+            'value="%s" />' % (unchosen.pk, bent.pk))
+
+        self.client.post(url, {
+            'object_%s' % chosen.pk: '',
+            'suggestion_%s' % chosen.pk: str(anders.pk),
+            'object_%s' % unchosen.pk: '',
+            'suggestion_%s' % unchosen.pk: '',
+        })
+        chosen.refresh_from_db()
+        unchosen.refresh_from_db()
+        self.assertEqual(chosen.person_id, anders.pk)
+        self.assertIsNone(unchosen.person_id)
+
+
+class BulkCreateWithIdsTest(TestCase):
+    def test_ids(self):
+        Person.objects.create(name='Before', dead=False,
+                              letter_bounced=False)
+        persons = [Person(name=str(i), dead=False, letter_bounced=False)
+                   for i in range(3)]
+        with transaction.atomic():
+            bulk_create_with_ids(Person, persons)
+        self.assertEqual(
+            [(p.pk, p.name) for p in persons],
+            list(Person.objects.filter(pk__in=[p.pk for p in persons])
+                 .order_by('pk').values_list('pk', 'name')))
+
+
+class LogRangeTest(SimpleTestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(b''.join(
+                b'[2016-06-03 22:38:50,123 j60adm INFO 127.0.0.1 bo] %d\n' % i
+                for i in range(10)))
+        self.opened = []
+        patcher = mock.patch('j60adm.logfile.open_log', self.open_log)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(os.remove, self.filename)
+
+    def open_log(self):
+        fp = open(self.filename, 'rb')
+        self.opened.append(fp)
+        return fp
+
+    def test_lines(self):
+        log_range = LogRange(tail=2)
+        self.assertEqual([line[-2:] for line in log_range.lines()],
+                         [b'8\n', b'9\n'])
+        self.assertTrue(all(fp.closed for fp in self.opened))
+
+    def test_not_consumed(self):
+        log_range = LogRange()
+        lines = log_range.lines()
+        self.assertTrue(all(fp.closed for fp in self.opened))
+        next(lines)
+        # As when the client disconnects and the response is closed
+        lines.close()
+        self.assertEqual(len(self.opened), 2)
+        self.assertTrue(all(fp.closed for fp in self.opened))
+
+
+class EmailStateTest(TestCase):
+    def create_person(self, name, *addresses):
+        """
+        addresses is a list of the bounce flags of the messages
+        sent to each address.
+        """
+        person = Person.objects.create(name=name, dead=False,
+                                       letter_bounced=False)
+        for i, bounces in enumerate(addresses):
+            address = EmailAddress.objects.create(
+                person=person, address='%s%s@example.com' % (name, i),
+                source='test')
+            for bounce in bounces:
+                EmailMessage.objects.create(recipient=address, bounce=bounce)
+        return person
+
+    def test_annotate_email_state(self):
+        expected = {
+            'none': self.create_person('none'),
+            'new': self.create_person('new', []),
+            'new2': self.create_person('new2', [True, True], []),
+            'bounce': self.create_person('bounce', [True], [True, True]),
+            'sent': self.create_person('sent', [True, False], [False], []),
+            'sent2': self.create_person('sent2', [False, False, True]),
+        }
+        persons = Person.objects.prefetch_related(
+            'emailaddress_set__emailmessage_set')
+        python = {p.name: person_email_state(p) for p in persons}
+        self.assertEqual(python, {
+            'none': 'none', 'new': 'new', 'new2': 'new',
+            'bounce': 'bounce', 'sent': 'sent', 'sent2': 'sent'})
+
+        qs = annotate_email_state(Person.objects.filter(
+            pk__in=[p.pk for p in expected.values()]))
+        for p in qs:
+            self.assertEqual(
+                (p.email_address_count, p.email_sent_count,
+                 p.email_new_count),
+                {'none': (0, 0, 0), 'new': (1, 0, 1), 'new2': (2, 0, 1),
+                 'bounce': (2, 0, 0), 'sent': (3, 2, 1),
+                 'sent2': (1, 2, 0)}[p.name])
+            self.assertEqual(
+                email_state(p.email_address_count, p.email_sent_count,
+                            p.email_new_count),
+                python[p.name])
+
+        self.assertEqual(dict(email_state_counts()), dict(
+            none=1, new=2, bounce=1, sent=2))
@@ -0,0 +1,112 @@
+import re
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+
+class TimestampFormat:
+    """
+    A local time format given as a regular expression with the named
+    groups year, month, day, hour, minute and second.
+
+    The pattern is compiled once. Parsed times are localized in the
+    default time zone, so the UTC offset is the one in effect at that
+    time (attaching a pytz zone with replace() would give the zone's
+    first historical offset instead). The offset is looked up once per
+    local hour, which is exact since DST transitions happen on the hour,
+    and the datetime is then built directly with that tzinfo.
+    """
+
+    fields = ('year', 'month', 'day', 'hour', 'minute', 'second')
+
+    def __init__(self, pattern, is_dst=False):
+        self.pattern = re.compile(pattern)
+        self.groups = tuple(self.pattern.groupindex[f] for f in self.fields)
+        # Used to resolve ambiguous and non-existent times around
+        # DST transitions instead of raising
+        self.is_dst = is_dst
+        self.tz = None
+        self.tzinfos = {}
+
+    def parse_fields(self, s):
+        mo = self.pattern.match(s)
+        if mo is None:
+            raise ValidationError("Invalid time: %s" % (s,))
+        return tuple(map(int, mo.group(*self.groups)))
+
+    def parse_naive(self, s):
+        try:
+            return datetime.datetime(*self.parse_fields(s))
+        except ValueError:
+            raise ValidationError("Invalid time: %s" % (s,))
+
+    def get_tzinfo(self, year, month, day, hour):
+        """
+        The tzinfo in effect at the given local hour.
+        """
+        key = (year, month, day, hour)
+        try:
+            return self.tzinfos[key]
+        except KeyError:
+            pass
+        if self.tz is None:
+            self.tz = timezone.get_default_timezone()
+        dt = datetime.datetime(*key)
+        if hasattr(self.tz, 'localize'):
+            tzinfo = self.tz.localize(dt, is_dst=self.is_dst).tzinfo
+        else:
+            tzinfo = self.tz
+        self.tzinfos[key] = tzinfo
+        return tzinfo
+
+    def parse(self, s):
+        """
+        >>> REGISTRATION_TIME.parse('03-06-2016 22:38:50').isoformat()
+        '2016-06-03T22:38:50+02:00'
+        >>> REGISTRATION_TIME.parse('03-01-2016 22:38:50').isoformat()
+        '2016-01-03T22:38:50+01:00'
+        >>> SURVEY_TIME.parse('10/30/2016 2:30:00').isoformat()
+        '2016-10-30T02:30:00+01:00'
+        """
+        fields = self.parse_fields(s)
+        try:
+            return datetime.datetime(
+                *fields, tzinfo=self.get_tzinfo(*fields[:4]))
+        except ValueError:
+            raise ValidationError("Invalid time: %s" % (s,))
+
+    def parse_column(self, values):
+        """
+        Parse an iterable of strings into a list of aware datetimes.
+        Same as calling parse() on each, with the lookups hoisted
+        out of the loop.
+        """
+        match = self.pattern.match
+        groups = self.groups
+        tzinfos = self.tzinfos
+        get_tzinfo = self.get_tzinfo
+        make = datetime.datetime
+        result = []
+        for s in values:
+            mo = match(s)
+            if mo is None:
+                raise ValidationError("Invalid time: %s" % (s,))
+            f = tuple(map(int, mo.group(*groups)))
+            try:
+                tzinfo = tzinfos.get(f[:4]) or get_tzinfo(*f[:4])
+                result.append(make(*f, tzinfo=tzinfo))
+            except ValueError:
+                raise ValidationError("Invalid time: %s" % (s,))
+        return result
+
+
+# Google Forms export, e.g. 6/3/2016 22:38:50 (month first)
+SURVEY_TIME = TimestampFormat(
+    r'(?P<month>\d+)/(?P<day>\d+)/(?P<year>\d+) ' +
+    r'(?P<hour>\d+):(?P<minute>\d+):(?P<second>\d+)')
+
+# Webshop export, e.g. 03-06-2016 22:38:50
+REGISTRATION_TIME = TimestampFormat(
+    r'(?P<day>\d{1,2})-(?P<month>\d{1,2})-(?P<year>\d{4}) ' +
+    r'(?P<hour>\d{1,2}):(?P<minute>\d{1,2}):(?P<second>\d{1,2})$')
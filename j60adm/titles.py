@@ -0,0 +1,87 @@
+import re
+import functools
+
+from django.core.exceptions import ValidationError
+
+from j60adm.models import Association, Title
+
+
+PREFIX_AGES = dict(zip('KGBOT', [-1, 1, 2, 3, 1]))
+
+token_pattern = re.compile(Title.pattern)
+full_pattern = re.compile('^(%s|%s)(%s)$' % (
+    Title.canonical_prefix_pattern, Title.prefix_pattern,
+    Title.title_pattern))
+prefix_term_pattern = re.compile(Title.prefix_term_pattern)
+
+
+def prefix_age(prefix):
+    """
+    >>> prefix_age('T40O'), prefix_age('OO'), prefix_age(''), prefix_age('K2')
+    (43, 6, 0, -2)
+    """
+    age = 0
+    for mo in prefix_term_pattern.finditer(prefix):
+        p = mo.group(0)
+        if len(p) == 1:
+            age += PREFIX_AGES[p]
+        else:
+            age += PREFIX_AGES[p[0]] * int(p[1:])
+    return age
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_title_at(s, current_period):
+    mo = full_pattern.match(s)
+    if mo is None:
+        raise ValidationError("Couldn't parse %r" % (s,))
+    return current_period - prefix_age(mo.group(1)), mo.group(2)
+
+
+def parse_title(s):
+    """
+    Parse a prefixed title into (period, title). Results are cached.
+
+    >>> parse_title('T40OSEKR')
+    (1972, 'SEKR')
+    >>> parse_title('OOFULD')
+    (2012, 'OFULD')
+    """
+    return parse_title_at(s, Association.get().current_period)
+
+
+def parse_title_line(line, current_period):
+    """
+    Parse one line of concatenated titles into [(period, title), ...].
+
+    >>> parse_title_line('GKASSOFORM', 2015)
+    [(2014, 'KASS'), (2012, 'FORM')]
+    >>> parse_title_line('GKASS OFORM', 2015)
+    Traceback (most recent call last):
+    ...
+    django.core.exceptions.ValidationError: ["Unparsed: ' ' in 'GKASS OFORM'"]
+    """
+    j = 0
+    titles = []
+    for mo in token_pattern.finditer(line):
+        i = mo.start(0)
+        if i != j:
+            raise ValidationError("Unparsed: %r in %r" % (line[j:i], line))
+        j = mo.end(0)
+        titles.append(parse_title_at(mo.group(0), current_period))
+    if j != len(line):
+        raise ValidationError("Unparsed end: %r" % (line[j:],))
+    return titles
+
+
+def parse_title_lines(text):
+    """
+    Parse a pasted block of titles, one person per line,
+    into a list of [(period, title), ...] for each line.
+
+    >>> parse_title_lines('GKASSOFORM\\n\\nFUAN')
+    [[(2014, 'KASS'), (2012, 'FORM')], [], [(2015, 'FUAN')]]
+    """
+    current_period = Association.get().current_period
+    return [parse_title_line(line, current_period)
+            for line in text.splitlines()]
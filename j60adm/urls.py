@@ -17,17 +17,17 @@ from django.conf.urls import url, include
 from django.contrib import admin
 from j60adm.views import (
     PersonImport, PersonList, PersonDetail, PersonNoteUpdate,
-    PersonListExport,
+    PersonListExport, PersonSearch, PersonPicker,
     RegistrationImport, RegistrationList, RegistrationPerson,
-    RegistrationShowUpdate,
+    RegistrationShowUpdate, RegistrationCapacity,
     SurveyResponseImport, SurveyResponseList,
     NewsletterAddressList,
-    Email, EmailAddressCreate, EmailSynchronize,
+    Email, EmailSummary, EmailAddressCreate, EmailSynchronize,
     EmailMessageCreate, EmailMessageBulkCreate,
     LetterBounce,
     PersonMessage,
     TitleImport,
-    Log,
+    Log, LogFollow,
 )
 
 
@@ -44,6 +44,10 @@ urlpatterns = [
         name='person_note_update'),
     url(r'^$', PersonList.as_view(),
         name='person_list'),
+    url(r'^person/search/$', PersonSearch.as_view(),
+        name='person_search'),
+    url(r'^person/picker\.json$', PersonPicker.as_view(),
+        name='person_picker'),
     url(r'^j60\.csv$', PersonListExport.as_view(),
         name='person_list'),
     url(r'^survey/import/$', SurveyResponseImport.as_view(),
@@ -56,12 +60,16 @@ urlpatterns = [
         name='registration_import'),
     url(r'^registration/$', RegistrationList.as_view(),
         name='registration_list'),
+    url(r'^registration/capacity/$', RegistrationCapacity.as_view(),
+        name='registration_capacity'),
     url(r'^registration/person/$', RegistrationPerson.as_view(),
         name='registration_person'),
     url(r'^registration/(?P<pk>\d+)/show/$', RegistrationShowUpdate.as_view(),
         name='registration_show_update'),
     url(r'^email/$', Email.as_view(),
         name='email'),
+    url(r'^email/summary/$', EmailSummary.as_view(),
+        name='email_summary'),
     url(r'^email/sync/$', EmailSynchronize.as_view(),
         name='email_synchronize'),
     url(r'^emailaddress/add/(?P<person>\d+)/$', EmailAddressCreate.as_view(),
@@ -75,6 +83,7 @@ urlpatterns = [
     url(r'^titleimport/$', TitleImport.as_view(),
         name='title_import'),
     url(r'^log/$', Log.as_view(), name='log'),
+    url(r'^log/follow/$', LogFollow.as_view(), name='log_follow'),
 ]
 
 # if settings.DEBUG:
@@ -1,5 +1,3 @@
-import io
-import re
 import csv
 import logging
 import datetime
@@ -8,22 +6,40 @@ from django.views.generic import (
 )
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.middleware.csrf import get_token
 from django.shortcuts import redirect, get_object_or_404
 from django.utils.decorators import method_decorator
 import django.contrib.auth.decorators
-from django.conf import settings
-from django.http import HttpResponse
+from django.http import (
+    HttpResponse, HttpResponseNotModified, HttpResponseBadRequest,
+    JsonResponse, StreamingHttpResponse,
+)
+from django.utils.http import urlencode
 
 from j60adm.models import (
     Registration, SurveyResponse, Person,
-    EmailAddress, EmailMessage, Title,
+    EmailAddress, EmailMessage, new_row_version,
 )
 from j60adm.forms import (
     RegistrationImportForm, RegistrationShowForm, SurveyResponseImportForm,
     PersonImportForm, PersonNoteUpdateForm,
     EmailAddressCreateForm, EmailMessageCreateForm, EmailMessageBulkCreateForm,
 )
-from j60adm.addresses import synchronize_addresses
+from j60adm.addresses import (
+    synchronize_addresses, persons_by_email_state, email_state_counts,
+)
+from j60adm.importer import (
+    import_persons, import_titles, import_registrations,
+)
+from j60adm.search import search_persons
+from j60adm.boards import person_boards
+from j60adm.picker import get_person_picker_version, get_person_picker_data
+from j60adm.matching import suggest_persons
+from j60adm.shows import show_counts
+from j60adm.logfile import LogRange
+from j60adm.rowcache import render_person_rows
+from j60adm.linking import reassign_persons_from_form, format_person_changes
 
 logger = logging.getLogger('j60adm')
 
@@ -38,43 +54,87 @@ class PersonImport(FormView):
     template_name = 'j60adm/person_import.html'
 
     def form_valid(self, form):
-        persons, objects, messages = form.cleaned_data['persons']
-        logger.info("PersonImport importing %s persons", len(persons),
+        dry_run = form.cleaned_data['dry_run']
+        logger.info("PersonImport importing%s",
+                    ' (dry run)' if dry_run else '',
                     extra=self.request.log_data)
-        for p in persons:
-            p.save()
-        for o in objects:
-            o.person = o.person  # Update o.person_id
-            o.save()
-        for m in messages:
-            m.recipient = m.recipient  # Update o.recipient_id
-            m.save()
+        try:
+            report = import_persons(form.cleaned_data['batches'],
+                                    dry_run=dry_run)
+        except ValidationError as exn:
+            form.add_error('file', exn)
+            return self.form_invalid(form)
+        logger.info("PersonImport %s", report, extra=self.request.log_data)
+        if dry_run:
+            return self.render_to_response(
+                self.get_context_data(form=form, report=report))
         return redirect('person_list')
 
 
 @login_required
 class PersonList(ListView):
     template_name = 'j60adm/person_list.html'
+    row_template_name = 'j60adm/person_list_row.html'
+    # Relations shown in each row
+    row_lookups = ['registration_set', 'surveyresponse_set',
+                   'emailaddress_set__emailmessage_set']
+    paginate_by = 100
 
     def get_queryset(self):
-        qs = Person.objects.all()
-        qs = qs.prefetch_related('registration_set', 'surveyresponse_set',
-                                 'title_set', 'emailaddress_set')
-        qs = sorted(qs, key=lambda p: p.title_order_key())
-        return qs
+        return search_persons(self.request.GET.get('q', ''))
+
+    def render_rows(self, persons):
+        """
+        HTML of the rows of the given persons. Rows are cached per
+        person, so only rows of persons changed since they were last
+        shown are rendered, with their relations prefetched.
+        """
+        persons = list(persons)
+        rows, rendered = render_person_rows(
+            persons, self.row_template_name, self.row_lookups,
+            get_token(self.request))
+        logger.debug("Rendered %s of %s person rows", rendered, len(persons),
+                     extra=self.request.log_data)
+        return rows
 
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
-        qs = context_data['object_list']
-        only_newsletter = sum(
-            1 for p in qs
-            if p.surveyresponse_set.all() and not p.registration_set.all())
-        context_data['only_newsletter'] = only_newsletter
+        qs = Person.objects.filter(surveyresponse__isnull=False,
+                                   registration__isnull=True)
+        context_data['only_newsletter'] = qs.distinct().count()
         return context_data
 
+    def render_to_response(self, context, **response_kwargs):
+        context['rows'] = self.render_rows(context['object_list'])
+        return super().render_to_response(context, **response_kwargs)
+
+
+class PersonSearch(PersonList):
+    def render_to_response(self, context, **response_kwargs):
+        page = context['page_obj']
+        rows = self.render_rows(context['object_list'])
+        return JsonResponse(dict(
+            count=page.paginator.count,
+            page=page.number,
+            next_page=page.next_page_number() if page.has_next() else None,
+            rows=rows,
+        ))
+
+
+class Echo:
+    """
+    File-like object for csv.writer that returns each row
+    instead of buffering it, for use with StreamingHttpResponse.
+    """
+
+    def write(self, value):
+        return value
+
 
 class PersonListExport(PersonList):
     content_type = 'text/csv'
+    paginate_by = None
+    chunk_size = 500
 
     header = ('Årgang', 'Titel', 'Navn', 'Email', 'Revy', 'Billet', 'Kost')
 
@@ -96,14 +156,33 @@ class PersonListExport(PersonList):
             ' '.join(r.dietary for r in registrations),
         )
 
+    def iter_persons(self, qs):
+        """
+        Iterate over qs in chunks of chunk_size persons,
+        each chunk with the relations needed by render_row() prefetched.
+        """
+        ids = list(qs.prefetch_related(None).values_list('pk', flat=True))
+        for i in range(0, len(ids), self.chunk_size):
+            chunk_ids = ids[i:i + self.chunk_size]
+            chunk = Person.objects.filter(pk__in=chunk_ids)
+            chunk = chunk.prefetch_related(
+                'registration_set', 'title_set',
+                'emailaddress_set__emailmessage_set')
+            by_id = {p.pk: p for p in chunk}
+            for pk in chunk_ids:
+                if pk in by_id:
+                    yield by_id[pk]
+
+    def iter_rows(self, qs):
+        writer = csv.writer(Echo(), 'excel-tab')
+        yield writer.writerow(self.header + (str(datetime.datetime.now()),))
+        for person in self.iter_persons(qs):
+            yield writer.writerow(self.render_row(person))
+
     def render_to_response(self, context, **response_kwargs):
         response_kwargs.setdefault('content_type', self.content_type)
-        buf = io.StringIO()
-        writer = csv.writer(buf, 'excel-tab')
-        writer.writerow(self.header + (str(datetime.datetime.now()),))
-        for person in context['object_list']:
-            writer.writerow(self.render_row(person))
-        return HttpResponse(buf.getvalue(), **response_kwargs)
+        return StreamingHttpResponse(
+            self.iter_rows(context['object_list']), **response_kwargs)
 
 
 @login_required
@@ -127,44 +206,7 @@ class PersonMessage(DetailView):
 
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
-        person = context_data['person']
-
-        boards = []
-        titles = person.title_set.all()
-        titles = titles.order_by('period')
-        for title in titles:
-            year = '%04d/%02d' % (title.period, (title.period + 1) % 100)
-            board_titles = Title.objects.filter(period=title.period)
-            board_titles = board_titles.exclude(pk=title.pk)
-            board_titles = board_titles.filter(person__dead=False)
-            board_titles = board_titles.select_related('person')
-            not_registered = []
-            no_email = []
-            registered = []
-            for board_title in board_titles:
-                board_person = board_title.person
-                name = '%s %s' % (board_title.title, board_person.name)
-
-                email_messages = EmailMessage.objects.filter(
-                    recipient__person=board_person, bounce=False)
-                try:
-                    email_address = email_messages[0].recipient.address
-                except IndexError:
-                    email_address = None
-
-                registration = Registration.objects.filter(person=board_person)
-                if registration.exists():
-                    registered.append(
-                        dict(name=name, email=email_address))
-                elif email_address is not None:
-                    not_registered.append(
-                        dict(name=name, email=email_address))
-                else:
-                    no_email.append(dict(name=name))
-            boards.append(dict(
-                year=year, not_registered=not_registered,
-                no_email=no_email, registered=registered))
-        context_data['boards'] = boards
+        context_data['boards'] = person_boards(context_data['person'])
         return context_data
 
 
@@ -207,52 +249,15 @@ class RegistrationImport(FormView):
 
     def form_valid(self, form):
         regs = form.cleaned_data['registrations']
-        reg_ids = [reg.survey_id for reg in regs]
-        qs = Registration.objects.filter(survey_id__in=reg_ids)
-        existing = {r.survey_id: r for r in qs}
-        errors = 0
-
-        save = []
-        create = []
-
-        for reg in regs:
-            try:
-                ex = existing[reg.survey_id]
-            except KeyError:
-                create.append(reg)
-                continue
-            # Don't bother with time since timezones are hard
-            KEYS = ('survey_id first_name last_name email dietary ' +
-                    'newsletter transportation').split()
-            for k in KEYS:
-                if getattr(ex, k) != getattr(reg, k):
-                    form.add_error(
-                        'registrations',
-                        'Entry %s differs on %s: %s != %s' %
-                        (reg.survey_id, k, getattr(ex, k), getattr(reg, k)))
-                    errors += 1
-            if ex.webshop_show != reg.webshop_show:
-                # If the show attribute changed, it must have changed to 'refund'
-                if reg.webshop_show != 'refund':
-                    form.add_error(
-                        'registrations',
-                        'Entry %s: Show changed from %s to %s' %
-                        (reg.survey_id, ex.webshop_show, reg.webshop_show))
-                    errors += 1
-                ex.webshop_show = reg.webshop_show
-                ex.note += reg.note
-                save.append(ex)
-        if errors:
+        try:
+            report = import_registrations(regs)
+        except ValidationError as exn:
+            form.add_error('registrations', exn)
             return self.form_invalid(form)
-        if create:
-            logger.info("RegistrationImport creating %s registrations",
-                        len(create), extra=self.request.log_data)
-        Registration.objects.bulk_create(create)
-        if save:
-            logger.info("RegistrationImport updating %s registrations",
-                        len(save), extra=self.request.log_data)
-        for reg in save:
-            reg.save()
+        logger.info("RegistrationImport created %s, updated %s and " +
+                    "skipped %s unchanged registrations",
+                    report.created, report.updated, report.unchanged,
+                    extra=self.request.log_data)
         return redirect('registration_list')
 
 
@@ -273,37 +278,58 @@ class RegistrationList(TemplateView):
             qs = qs.order_by('show')
         else:
             qs = qs.order_by('person', '-survey_id')
-        registrations = list(qs)
-        context_data['object_list'] = registrations
+        context_data['object_list'] = qs
 
         counts = []
-        for key, label in Registration._meta.get_field('show').choices:
-            show_count = sum(1 for r in registrations
-                             if r.show == key)
-            webshop_count = sum(1 for r in registrations
-                                if r.webshop_show == key)
-            if key in ('first', 'second'):
-                limit = 200 + (webshop_count - show_count)
+        for c in show_counts():
+            if c.seats_left is not None:
+                limit = c.webshop_count + c.seats_left
+            elif c.webshop_count == c.count:
+                limit = '∞'
+            elif c.webshop_count < c.count:
+                limit = '∞ − %s' % (c.count - c.webshop_count)
             else:
-                if webshop_count == show_count:
-                    limit = '∞'
-                elif webshop_count < show_count:
-                    limit = '∞ − %s' % (show_count - webshop_count)
-                else:
-                    limit = '∞ + %s' % (webshop_count - show_count)
-            if key == 'first':
-                limit -= 15
+                limit = '∞ + %s' % (c.webshop_count - c.count)
             counts.append(dict(
-                key=key,
-                label=label,
-                count=show_count,
-                webshop_count=webshop_count,
+                key=c.key,
+                label=c.label,
+                count=c.count,
+                webshop_count=c.webshop_count,
                 webshop_limit=limit,
             ))
         context_data['counts'] = counts
         return context_data
 
 
+@login_required
+class RegistrationCapacity(View):
+    """
+    Tickets sold and seats left per show, for polling during ticket sales.
+    """
+
+    def get(self, request):
+        counts = show_counts()
+        shows = [dict(key=c.key, label=c.label, sold=c.count,
+                      webshop_sold=c.webshop_count, seats_left=c.seats_left)
+                 for c in counts if c.seats_left is not None]
+        refunds = sum(c.count for c in counts if c.key == 'refund')
+        return JsonResponse(dict(
+            shows=shows, refunds=refunds,
+            total=sum(c.count for c in counts)))
+
+
+def add_suggestions(rows):
+    """
+    Set row.suggestions to the candidate persons of each unlinked row
+    and return the number of rows with a suggestion.
+    """
+    unlinked = [row for row in rows if row.person_id is None]
+    suggestions = suggest_persons(unlinked)
+    for row in unlinked:
+        row.suggestions = suggestions.get(row.pk, [])
+    return len(suggestions)
+
+
 @login_required
 class RegistrationPerson(TemplateView):
     template_name = 'j60adm/registration_person.html'
@@ -314,26 +340,20 @@ class RegistrationPerson(TemplateView):
         qs = qs.order_by('person', '-survey_id')
         registrations = list(qs)
         context_data['object_list'] = registrations
-        qs = Person.objects.all()
-        qs = qs.prefetch_related('title_set')
-        context_data['person_list'] = qs
+        if self.request.GET.get('suggest'):
+            context_data['suggested'] = add_suggestions(registrations)
+        context_data['person_picker_version'] = (
+            get_person_picker_version())
         return context_data
 
     def post(self, request):
-        save = []
-        for r in Registration.objects.all():
-            k = 'object_%s' % r.id
-            if k in request.POST:
-                v = request.POST[k]
-                if v and r.person_id != int(v):
-                    r.person_id = int(v)
-                    save.append(r)
-        if save:
-            logger.info("RegistrationPerson updating %s registrations",
-                        len(save), extra=self.request.log_data)
-        for r in save:
-            r.save()
-        return self.get(request)
+        changes = reassign_persons_from_form(Registration, request.POST)
+        if changes:
+            logger.info("RegistrationPerson updating %s registrations: %s",
+                        len(changes), format_person_changes(changes),
+                        extra=self.request.log_data)
+        return self.render_to_response(
+            self.get_context_data(changes=changes))
 
 
 @login_required
@@ -358,24 +378,22 @@ class SurveyResponseList(TemplateView):
         context_data = super().get_context_data(**kwargs)
         qs = SurveyResponse.objects.all()
         qs = qs.order_by('person')
-        context_data['object_list'] = qs
-        qs = Person.objects.all()
-        qs = qs.prefetch_related('title_set')
-        context_data['person_list'] = qs
+        responses = list(qs)
+        context_data['object_list'] = responses
+        if self.request.GET.get('suggest'):
+            context_data['suggested'] = add_suggestions(responses)
+        context_data['person_picker_version'] = (
+            get_person_picker_version())
         return context_data
 
     def post(self, request):
-        for r in SurveyResponse.objects.all():
-            k = 'object_%s' % r.id
-            if k in request.POST:
-                v = request.POST[k]
-                if v and int(v) != r.person_id:
-                    logger.info("Set SurveyResponse(id=%s).person_id = %s",
-                                r.id, v,
-                                extra=self.request.log_data)
-                    r.person_id = int(v)
-                    r.save()
-        return self.get(request)
+        changes = reassign_persons_from_form(SurveyResponse, request.POST)
+        if changes:
+            logger.info("SurveyResponseList updating %s responses: %s",
+                        len(changes), format_person_changes(changes),
+                        extra=self.request.log_data)
+        return self.render_to_response(
+            self.get_context_data(changes=changes))
 
 
 @login_required
@@ -420,47 +438,29 @@ class Email(TemplateView):
 
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
-        qs = Person.objects.all()
-        qs = qs.prefetch_related('emailaddress',
-                                 'emailaddress__emailmessage')
-        by_state = dict(none=[], new=[], sent=[], bounce=[])
-        for p in Person.objects.all():
-            addresses = list(p.emailaddress_set.all())
-            if not addresses:
-                by_state['none'].append(p)
-                continue
-            message_sets = [list(a.emailmessage_set.all()) for a in addresses]
-            any_new = any(not message_set for message_set in message_sets)
-            any_sent = any(any(not message.bounce for message in message_set)
-                           for message_set in message_sets)
-            if any_sent:
-                by_state['sent'].append(p)
-            elif any_new:
-                by_state['new'].append(p)
-            else:
-                by_state['bounce'].append(p)
-        by_state['bounce'].sort(
-            key=lambda p: next(
-                a.address[a.address.index('@'):]
-                for a in p.emailaddress_set.all()
-                if any(m.bounce for m in a.emailmessage_set.all())))
+        by_state = persons_by_email_state()
         recipients = []
         for p in by_state['new']:
-            # TODO fix race condition by only retrieving emailaddress_set once
             emailaddress = next(
                 a.address for a in p.emailaddress_set.all()
-                if not list(a.emailmessage_set.all()))
+                if not a.emailmessage_set.all())
             recipients.append('"%s" <%s>' % (p.name, emailaddress))
         context_data['recipients'] = ',\n'.join(recipients)
         context_data['n_new'] = len(by_state['new'])
         context_data['n_bounce'] = len(by_state['bounce'])
         context_data['n_none'] = len(by_state['none'])
         context_data['n_sent'] = len(by_state['sent'])
-        context_data['person_list'] = (by_state['new'] + by_state['bounce'] +
-                                       by_state['none'] + by_state['sent'])
+        context_data['person_list'] = [
+            p for persons in by_state.values() for p in persons]
         return context_data
 
 
+@login_required
+class EmailSummary(View):
+    def get(self, request):
+        return JsonResponse(email_state_counts())
+
+
 @login_required
 class EmailMessageCreate(FormView):
     form_class = EmailMessageCreateForm
@@ -498,13 +498,12 @@ class EmailAddressCreate(FormView):
 
     def form_valid(self, form):
         person = self.get_person()
-        address = form.cleaned_data['address']
+        address = EmailAddress.normalize(form.cleaned_data['address'])
         logger.info("Create EmailAddress %s for %s", address, person,
                     extra=self.request.log_data)
-        EmailAddress(
-            person=person,
-            address=address,
-            source='Manually entered').save()
+        EmailAddress.objects.get_or_create(
+            person=person, address=address,
+            defaults=dict(source='Manually entered'))
         return redirect('email')
 
 
@@ -532,16 +531,21 @@ class EmailMessageBulkCreate(FormView):
             return self.form_invalid(form)
         logger.info("Bulk create messages %s", m,
                     extra=self.request.log_data)
-        EmailMessage.objects.bulk_create(m)
+        with transaction.atomic():
+            EmailMessage.objects.bulk_create(m)
+            Person.bump_row_versions(e.recipient.person_id for e in m)
         return redirect('email')
 
 
 @login_required
 class EmailSynchronize(View):
     def post(self, request):
-        logger.info("EmailSynchronize.post",
+        full = bool(request.POST.get('full'))
+        logger.info("EmailSynchronize.post%s", ' (full)' if full else '',
+                    extra=self.request.log_data)
+        created = synchronize_addresses(full=full)
+        logger.info("EmailSynchronize created %s addresses", created,
                     extra=self.request.log_data)
-        synchronize_addresses()
         return redirect('email')
 
 
@@ -554,9 +558,8 @@ class LetterBounce(TemplateView):
         person_ids = ','.join(
             str(p.id) for p in Person.objects.filter(letter_bounced=True))
         context_data['person_ids'] = person_ids
-        qs = Person.objects.all()
-        qs = qs.prefetch_related('title_set')
-        context_data['person_list'] = qs
+        context_data['person_picker_version'] = (
+            get_person_picker_version())
         return context_data
 
     def post(self, request):
@@ -571,21 +574,83 @@ class LetterBounce(TemplateView):
         if add:
             logger.info("LetterBounce add %s", add,
                         extra=self.request.log_data)
-            Person.objects.filter(id__in=add).update(letter_bounced=True)
+            Person.objects.filter(id__in=add).update(
+                letter_bounced=True, row_version=new_row_version())
         if remove:
             logger.info("LetterBounce remove %s", remove,
                         extra=self.request.log_data)
-            Person.objects.filter(id__in=remove).update(letter_bounced=False)
+            Person.objects.filter(id__in=remove).update(
+                letter_bounced=False, row_version=new_row_version())
         return self.get(request)
 
 
+@login_required
+class PersonPicker(View):
+    """
+    Person.dump() of every person for the person pickers. Pages link to
+    it with ?v=<version>, so the browser can cache it until it changes.
+    """
+
+    def get(self, request):
+        version, data = get_person_picker_data()
+        etag = '"%s"' % version
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(data, content_type='application/json')
+        response['ETag'] = etag
+        if request.GET.get('v') == version:
+            response['Cache-Control'] = 'private, max-age=31536000'
+        else:
+            response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
 @login_required
 class Log(View):
+    """
+    The log as text, or the part selected by the query parameters start
+    and end (byte offsets), tail (number of lines before end), user and
+    ip. With follow=1 and start, wait for lines after start (long
+    polling). The X-Log-Offset header is the start of the next request.
+    """
+
+    def get_offset(self, name):
+        value = self.request.GET.get(name) or None
+        if value is not None:
+            value = int(value)
+            if value < 0:
+                raise ValueError(value)
+        return value
+
     def get(self, request):
-        filename = settings.LOGGING['handlers']['file']['filename']
-        with open(filename) as fp:
-            s = fp.read()
-        return HttpResponse(s, content_type='text/plain; charset=utf8')
+        try:
+            start, end, tail = map(self.get_offset, ('start', 'end', 'tail'))
+        except ValueError:
+            return HttpResponseBadRequest(
+                'start, end og tail skal være ikke-negative heltal')
+        log_range = LogRange(start=start, end=end, tail=tail,
+                             follow=request.GET.get('follow') == '1')
+        lines = log_range.lines(user=request.GET.get('user') or None,
+                                ip=request.GET.get('ip') or None)
+        response = StreamingHttpResponse(
+            lines, content_type='text/plain; charset=utf8')
+        response['X-Log-Offset'] = log_range.end
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+@login_required
+class LogFollow(TemplateView):
+    template_name = 'j60adm/log_follow.html'
+
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        context_data['tail'] = self.request.GET.get('tail') or 200
+        context_data['filter'] = urlencode(
+            [(k, self.request.GET[k]) for k in ('user', 'ip')
+             if self.request.GET.get(k)])
+        return context_data
 
 
 @login_required
@@ -593,45 +658,10 @@ class TitleImport(TemplateView):
     template_name = 'j60adm/title_import.html'
 
     def post(self, request):
-        s = request.POST['titles']
-        lines = s.splitlines()
-        create = []
-        for line in lines:
-            j = 0
-            titles = []
-            for mo in re.finditer(Title.pattern, line):
-                i = mo.start(0)
-                if i != j:
-                    raise ValidationError("Unparsed: %r in %r" %
-                                          (line[j:i], line))
-                j = mo.end(0)
-                try:
-                    titles.append(Title.parse(mo.group(0)))
-                except ValueError as exn:
-                    raise ValidationError(*exn.args)
-            if j != len(line):
-                raise ValidationError("Unparsed end: %r" % (line[j:],))
-            if len(titles) <= 1:
-                continue
-            new = []
-            persons = set()
-
-            for t in titles:
-                try:
-                    ex = Title.objects.get(period=t.period, title=t.title)
-                except Title.DoesNotExist:
-                    new.append(t)
-                else:
-                    persons.add(ex.person)
-            if len(persons) != 1:
-                raise ValidationError(
-                    "Persons with title %s: %s" % (titles, persons))
-            person, = persons
-            for d in new:
-                d.person = person
-            create.extend(new)
-        if create:
-            logger.info("TitleImport creating %s titles", len(create),
+        report = import_titles(request.POST['titles'])
+        created = sum(len(line.created) for line in report
+                      if line.status == 'created')
+        if created:
+            logger.info("TitleImport creating %s titles", created,
                         extra=self.request.log_data)
-        Title.objects.bulk_create(create)
-        return self.get(request)
+        return self.render_to_response(self.get_context_data(report=report))